@@ -6,6 +6,11 @@ Run this once before starting the app to accept the terms.
 
 import os
 import sys
+from services.hub_cache import enable_hf_transfer
+
+# Must be set before huggingface_hub is imported
+enable_hf_transfer()
+
 from huggingface_hub import login, hf_hub_download
 from huggingface_hub.utils import HfHubHTTPError
 
@@ -69,7 +74,9 @@ def accept_tts_terms():
             repo_id="coqui/XTTS-v2",
             filename="config.json",
             local_dir="./models/coqui",
-            force_download=False
+            force_download=False,
+            resume_download=True,
+            etag_timeout=30
         )
         print("✓ Terms accepted! Model repository accessed successfully.")
         return True
@@ -4,8 +4,16 @@ Provides endpoints for transcription, translation, emotion detection, TTS, and l
 """
 
 import os
+
+# CUDA caching allocator: grow segments in place instead of fragmenting VRAM across the
+# many differently sized KV-cache allocations of repeated generate() calls.
+# Must be set before torch initializes CUDA.
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,max_split_size_mb:128")
+
 import sys
 import gc
+import time
+import asyncio
 import torch
 import logging
 from pathlib import Path
@@ -13,12 +21,21 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
 # Import services
-from services.transcribe import transcribe_router, load_whisper_model
-from services.translate import translate_router, load_translation_model
-from services.emotion import emotion_router, load_emotion_model
-from services.tts import tts_router, load_tts_model
+from services.transcribe import (
+    transcribe_router, load_whisper_model, start_whisper_worker, stop_whisper_worker,
+    WHISPER_WORKER_PROCESS
+)
+from services.translate import translate_router, load_translation_model, start_translation_batcher
+from services.emotion import emotion_router, load_emotion_model, start_emotion_batcher
+from services.tts import tts_router, load_tts_model, remove_output_cache, TTS_STREAMS
 from services.lipsync import lipsync_router, load_lipsync_model
+from services.cuda_streams import create_model_stream
 
 # Configure logging
 logging.basicConfig(
@@ -30,14 +47,29 @@ logger = logging.getLogger(__name__)
 # Configuration
 MODEL_DIR = os.getenv("MODEL_CACHE_DIR", "./models")
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+# Load CPU models at import so `gunicorn --preload` workers share them copy-on-write
+# (CUDA contexts don't survive fork, so GPU models are always loaded per worker)
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "0") == "1"
+
+if DEVICE == "cuda":
+    # TF32 tensor cores for fp32 matmuls/convs, cuDNN autotuning for the vocoder convolutions
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
+    torch.backends.cudnn.benchmark = True
 
 # Global model storage
 models = {}
 
+# /stats is served from a short-lived cache; NVML handle is opened once at startup
+STATS_TTL_SECONDS = 1.0
+stats_cache = {"time": 0.0, "value": None}
+nvml_handle = None
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Load models on startup, cleanup on shutdown"""
+    global nvml_handle
     logger.info("Starting up...")
     logger.info(f"Device: {DEVICE}")
     logger.info(f"Model directory: {MODEL_DIR}")
@@ -49,55 +81,99 @@ async def lifespan(app: FastAPI):
     else:
         logger.warning("CUDA not available, using CPU (will be slower)")
     
-    # Load models with memory cleanup between loads
-    try:
-        logger.info("Loading Whisper model...")
-        models["whisper"] = load_whisper_model(MODEL_DIR, DEVICE)
-        logger.info("✓ Whisper model loaded")
-        gc.collect()
-        if DEVICE == "cuda":
-            torch.cuda.empty_cache()
-        
-        # Skip translation model at startup - will lazy load on first request
-        # This saves memory as it's the largest model (~2GB for 600M version)
-        logger.info("Skipping translation model at startup (will lazy load on first request)")
-        models["translate"] = None  # Mark as not loaded yet
-        
-        logger.info("Loading emotion model...")
-        models["emotion"] = load_emotion_model(MODEL_DIR, DEVICE)
-        logger.info("✓ Emotion model loaded")
-        gc.collect()
-        if DEVICE == "cuda":
-            torch.cuda.empty_cache()
-        
-        # Try to load TTS model, but don't fail startup if terms not accepted
-        logger.info("Loading TTS model...")
+    # NVML for in-process GPU stats (no nvidia-smi subprocess per request)
+    if torch.cuda.is_available() and pynvml is not None:
         try:
-            models["tts"] = load_tts_model(MODEL_DIR, DEVICE)
-            logger.info("✓ TTS model loaded")
+            pynvml.nvmlInit()
+            nvml_handle = pynvml.nvmlDeviceGetHandleByIndex(0)
         except Exception as e:
-            logger.warning(f"TTS model failed to load (will lazy-load on first request): {e}")
-            models["tts"] = None  # Mark as not loaded yet
-        gc.collect()
-        if DEVICE == "cuda":
-            torch.cuda.empty_cache()
-        
+            logger.warning(f"NVML not available, GPU stats disabled: {e}")
+    
+    # Dedicated CUDA stream per model so endpoints don't serialize on the default stream
+    # (Whisper runs on CTranslate2, which manages its own streams); each TTS slot gets a
+    # second stream so the vocoder of one sentence overlaps GPT decoding of the next
+    for name in ("translate", "emotion", *(name for pair in TTS_STREAMS for name in pair)):
+        create_model_stream(name, DEVICE)
+    
+    # Load models concurrently: loads are dominated by weight reads and GIL-releasing
+    # tensor copies, so startup costs roughly the slowest model instead of the sum
+    if WHISPER_WORKER_PROCESS:
+        logger.info("Starting Whisper worker process...")
+        whisper_loader = start_whisper_worker
+    else:
+        logger.info("Loading Whisper model...")
+        whisper_loader = load_whisper_model
+    loaders = {"whisper": whisper_loader, "tts": load_tts_model}
+    if getattr(app.state, "emotion", None) is None:
+        logger.info("Loading emotion model...")
+        loaders["emotion"] = load_emotion_model
+    else:
+        logger.info("✓ Emotion model preloaded")
+    logger.info("Loading TTS model...")
+    
+    # Skip translation model at startup - will lazy load on first request
+    # This saves memory as it's the largest model (~2GB for 600M version)
+    logger.info("Skipping translation model at startup (will lazy load on first request)")
+    models["translate"] = None  # Mark as not loaded yet
+    
+    results = await asyncio.gather(
+        *(asyncio.to_thread(loader, MODEL_DIR, DEVICE) for loader in loaders.values()),
+        return_exceptions=True
+    )
+    for name, result in zip(loaders, results):
+        if isinstance(result, Exception):
+            if name == "tts":
+                # Don't fail startup if TTS terms not accepted
+                logger.warning(f"TTS model failed to load (will lazy-load on first request): {result}")
+            else:
+                logger.error(f"Error loading {name} model: {result}")
+                logger.error("Some endpoints may not work correctly")
+            models[name] = None  # Mark as not loaded yet
+            continue
+        if name == "emotion":
+            app.state.emotion = result
+        models[name] = result
+        logger.info(f"✓ {name} model loaded")
+    if "emotion" not in loaders:
+        models["emotion"] = app.state.emotion
+    
+    try:
         logger.info("Loading lip-sync model...")
         models["lipsync"] = load_lipsync_model(MODEL_DIR)
         logger.info("✓ Lip-sync model loaded")
-        gc.collect()
-        if DEVICE == "cuda":
-            torch.cuda.empty_cache()
-        
-        logger.info("All models loaded successfully!")
     except Exception as e:
         logger.error(f"Error loading models: {e}")
         logger.error("Some endpoints may not work correctly")
     
+    gc.collect()
+    if DEVICE == "cuda":
+        torch.cuda.empty_cache()
+    
+    # Start the translation micro-batching worker (model itself is loaded lazily)
+    translation_batcher = start_translation_batcher()
+    
+    # Start the emotion micro-batching worker (per worker process: the queue is bound to its loop)
+    emotion_batcher = None
+    if getattr(app.state, "emotion", None) is not None:
+        emotion_batcher = start_emotion_batcher(app.state.emotion)
+    
     yield
     
     # Cleanup on shutdown
     logger.info("Shutting down...")
+    for batcher in (translation_batcher, emotion_batcher):
+        if batcher is None:
+            continue
+        batcher.cancel()
+        try:
+            await batcher
+        except asyncio.CancelledError:
+            pass
+    stop_whisper_worker()
+    remove_output_cache()
+    if nvml_handle is not None:
+        pynvml.nvmlShutdown()
+        nvml_handle = None
     models.clear()
 
 
@@ -109,6 +185,10 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+if PRELOAD_MODELS and DEVICE == "cpu":
+    logger.info("Preloading emotion model before worker fork...")
+    app.state.emotion = load_emotion_model(MODEL_DIR, DEVICE)
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -150,11 +230,25 @@ async def health_check():
     }
 
 
+def format_uptime(seconds: float) -> str:
+    """Format seconds like `uptime -p`"""
+    minutes = int(seconds // 60)
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    parts = [
+        f"{value} {unit}{'s' if value != 1 else ''}"
+        for value, unit in ((days, "day"), (hours, "hour"), (minutes, "minute"))
+        if value
+    ]
+    return "up " + ", ".join(parts or ["0 minutes"])
+
+
 @app.get("/stats")
 async def get_stats():
     """Get system statistics and cost tracking"""
-    import subprocess
-    import time
+    now = time.monotonic()
+    if stats_cache["value"] is not None and now - stats_cache["time"] < STATS_TTL_SECONDS:
+        return stats_cache["value"]
     
     stats = {
         "device": DEVICE,
@@ -162,24 +256,24 @@ async def get_stats():
         "models_loaded": list(models.keys())
     }
     
-    # GPU stats if available
+    # GPU stats if available (same fields as nvidia-smi: utilization %, MiB used, MiB total)
     if torch.cuda.is_available():
         try:
-            gpu_info = subprocess.check_output(
-                ["nvidia-smi", "--query-gpu=utilization.gpu,memory.used,memory.total", "--format=csv,noheader,nounits"],
-                stderr=subprocess.DEVNULL
-            ).decode().strip()
-            stats["gpu_info"] = gpu_info
+            util = pynvml.nvmlDeviceGetUtilizationRates(nvml_handle)
+            mem = pynvml.nvmlDeviceGetMemoryInfo(nvml_handle)
+            stats["gpu_info"] = f"{util.gpu}, {mem.used // 1024 ** 2}, {mem.total // 1024 ** 2}"
         except:
             stats["gpu_info"] = "Unable to get GPU info"
     
     # Uptime
     try:
-        uptime = subprocess.check_output(["uptime", "-p"], stderr=subprocess.DEVNULL).decode().strip()
-        stats["uptime"] = uptime
+        with open("/proc/uptime") as f:
+            stats["uptime"] = format_uptime(float(f.read().split()[0]))
     except:
         stats["uptime"] = "Unable to get uptime"
     
+    stats_cache["time"] = now
+    stats_cache["value"] = stats
     return stats
 
 
@@ -8,14 +8,26 @@ Estimated total size: ~15-20GB
 import os
 import sys
 import argparse
+import hashlib
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from services.hub_cache import enable_hf_transfer, resolve_hf_cache_dir
+
+# Must be set before huggingface_hub is imported (directly or via transformers/TTS)
+enable_hf_transfer()
+
 from tqdm import tqdm
 import torch
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, AutoModel, AutoProcessor
-import whisper
+from faster_whisper import WhisperModel
 from TTS.api import TTS
 import requests
+from huggingface_hub import snapshot_download
+
+try:
+    import ctranslate2
+except ImportError:
+    ctranslate2 = None
 
 # Model configurations
 MODELS = {
@@ -23,13 +35,16 @@ MODELS = {
         "name": "large-v3",
         "type": "whisper",
         "size_gb": 3.0,
-        "description": "Whisper large-v3 for transcription"
+        "description": "Whisper large-v3 (faster-whisper/CTranslate2) for transcription"
     },
     "nllb": {
         "name": "facebook/nllb-200-3.3B",
         "type": "transformers",
         "size_gb": 6.6,
-        "description": "NLLB-200-3.3B for translation"
+        "description": "NLLB-200-3.3B for translation",
+        # Model served by the API, converted to int8 CTranslate2 (see services/translate.py)
+        "ct2_source": "facebook/nllb-200-distilled-600M",
+        "ct2_dir": "nllb-ct2-int8"
     },
     "emotion": {
         "name": "j-hartmann/emotion-english-distilroberta-base",
@@ -47,11 +62,19 @@ MODELS = {
         "name": "wav2lip_gan",
         "type": "checkpoint",
         "url": "https://github.com/Rudrabha/Wav2Lip/releases/download/v1.0.0/wav2lip_gan.pth",
+        "sha256": None,  # Set to pin the expected checkpoint digest
         "size_gb": 0.4,
         "description": "Wav2Lip checkpoint for lip sync"
     }
 }
 
+# Models are fetched concurrently; each Hub snapshot also downloads its files in parallel
+DOWNLOAD_WORKERS = 4
+HUB_MAX_WORKERS = 8
+
+# Weight formats we never load (TF/Flax/Rust/ONNX exports)
+HUB_IGNORE_PATTERNS = ["*.h5", "*.msgpack", "*.ot", "*.onnx", "flax_*", "tf_*", "rust_*"]
+
 
 def get_disk_space(path):
     """Get available disk space in GB"""
@@ -59,6 +82,21 @@ def get_disk_space(path):
     return stat.free / (1024 ** 3)
 
 
+def tree_size(path):
+    """Total size in bytes of all files under path (symlinks counted, not followed)"""
+    total = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                total += tree_size(entry.path)
+            else:
+                try:
+                    total += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    pass
+    return total
+
+
 def check_model_exists(model_dir, model_key):
     """Check if model is already downloaded"""
     model_config = MODELS[model_key]
@@ -68,51 +106,108 @@ def check_model_exists(model_dir, model_key):
         return os.path.exists(checkpoint_path) and os.path.getsize(checkpoint_path) > 1000000
     
     if model_key == "whisper":
-        # Check if whisper model cache exists
-        whisper_cache = os.path.join(model_dir, "whisper", model_config["name"])
+        # faster-whisper stores the CTranslate2 conversion in a HuggingFace cache layout
+        whisper_cache = os.path.join(
+            model_dir, "faster-whisper", f"models--Systran--faster-whisper-{model_config['name']}"
+        )
         return os.path.exists(whisper_cache)
     
     if model_key == "xtts":
         # XTTS models are cached by TTS library
         return True  # Will be checked during actual download
     
-    # For transformers models, check cache directory
-    cache_dir = os.path.join(model_dir, "transformers")
-    model_name = model_config["name"].replace("/", "--")
+    # For transformers models, check cache directory (HuggingFace "models--org--name" layout)
+    cache_dir = resolve_hf_cache_dir(model_dir)
+    model_name = "models--" + model_config["name"].replace("/", "--")
     model_path = os.path.join(cache_dir, model_name)
-    return os.path.exists(model_path)
+    if not os.path.exists(model_path):
+        return False
+    
+    # Installs from before the CTranslate2 backend have the snapshot but no conversion
+    if "ct2_dir" in model_config and ctranslate2 is not None:
+        return os.path.exists(os.path.join(model_dir, model_config["ct2_dir"], "model.bin"))
+    return True
+
+
+def hash_file(path, digest):
+    """Feed an existing file into a hashlib digest in 1 MiB blocks"""
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest
 
 
-def download_wav2lip(model_dir, url):
-    """Download Wav2Lip checkpoint"""
+def download_wav2lip(model_dir, url, retries=3, sha256=None):
+    """
+    Download Wav2Lip checkpoint, resuming with HTTP Range requests on failure
+    
+    The file is pre-allocated and hashed while streaming; it is only moved into
+    place once it is complete (and matches `sha256`, if given).
+    """
     checkpoint_path = os.path.join(model_dir, "wav2lip_gan.pth")
+    partial_path = checkpoint_path + ".part"
     
     if os.path.exists(checkpoint_path):
         print(f"  ✓ Wav2Lip checkpoint already exists")
         return True
     
     print(f"  Downloading Wav2Lip checkpoint...")
-    try:
-        response = requests.get(url, stream=True)
-        total_size = int(response.headers.get('content-length', 0))
-        
-        with open(checkpoint_path, 'wb') as f, tqdm(
-            desc="  Progress",
-            total=total_size,
-            unit='B',
-            unit_scale=True,
-            unit_divisor=1024,
-        ) as bar:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    bar.update(len(chunk))
-        
-        print(f"  ✓ Wav2Lip checkpoint downloaded")
-        return True
-    except Exception as e:
-        print(f"  ✗ Error downloading Wav2Lip: {e}")
-        return False
+    for attempt in range(1, retries + 1):
+        try:
+            offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            
+            with requests.get(url, stream=True, timeout=(10, 300), headers=headers) as response:
+                if offset and response.status_code == 416:
+                    # Partial file is unusable for this server, start over
+                    os.remove(partial_path)
+                    raise IOError("range not satisfiable, restarting download")
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    # Server ignored the Range header, start over
+                    offset = 0
+                content_length = int(response.headers.get('content-length', 0))
+                total_size = offset + content_length
+                digest = hash_file(partial_path, hashlib.sha256()) if offset else hashlib.sha256()
+                
+                with open(partial_path, 'r+b' if offset else 'wb') as f, tqdm(
+                    desc="  Progress",
+                    total=total_size,
+                    initial=offset,
+                    unit='B',
+                    unit_scale=True,
+                    unit_divisor=1024,
+                ) as bar:
+                    f.seek(offset)
+                    if content_length and hasattr(os, "posix_fallocate"):
+                        try:
+                            os.posix_fallocate(f.fileno(), offset, content_length)
+                        except OSError:
+                            pass  # Filesystem doesn't support it
+                    try:
+                        for chunk in response.iter_content(chunk_size=1 << 20):
+                            if chunk:
+                                f.write(chunk)
+                                digest.update(chunk)
+                                bar.update(len(chunk))
+                    finally:
+                        # Drop the pre-allocated tail so a retry resumes from the last written byte
+                        f.truncate(f.tell())
+                    written = f.tell()
+            
+            if content_length and written != total_size:
+                raise IOError(f"incomplete download ({written}/{total_size} bytes)")
+            if sha256 and digest.hexdigest() != sha256.lower():
+                os.remove(partial_path)
+                raise IOError(f"checksum mismatch (got sha256 {digest.hexdigest()})")
+            
+            os.replace(partial_path, checkpoint_path)
+            print(f"  ✓ Wav2Lip checkpoint downloaded (sha256 {digest.hexdigest()})")
+            return True
+        except Exception as e:
+            print(f"  ✗ Error downloading Wav2Lip (attempt {attempt}/{retries}): {e}")
+    
+    return False
 
 
 def download_whisper(model_dir, model_name):
@@ -120,7 +215,13 @@ def download_whisper(model_dir, model_name):
     print(f"  Loading Whisper model (this will download if not cached)...")
     try:
         device = "cuda" if torch.cuda.is_available() else "cpu"
-        model = whisper.load_model(model_name, device=device, download_root=os.path.join(model_dir, "whisper"))
+        compute_type = "int8_float16" if device == "cuda" else "int8"
+        model = WhisperModel(
+            model_name,
+            device=device,
+            compute_type=compute_type,
+            download_root=os.path.join(model_dir, "faster-whisper")
+        )
         print(f"  ✓ Whisper model loaded")
         return True
     except Exception as e:
@@ -128,57 +229,63 @@ def download_whisper(model_dir, model_name):
         return False
 
 
+def download_hub_snapshot(model_dir, model_name):
+    """Download all weight/tokenizer files of a Hub repo with parallel connections"""
+    cache_dir = resolve_hf_cache_dir(model_dir)
+    
+    return snapshot_download(
+        model_name,
+        cache_dir=cache_dir,
+        ignore_patterns=HUB_IGNORE_PATTERNS,
+        max_workers=HUB_MAX_WORKERS,
+        resume_download=True,
+        etag_timeout=30
+    )
+
+
 def download_transformers_model(model_dir, model_name):
     """Download transformers model"""
-    print(f"  Loading transformers model (this will download if not cached)...")
+    print(f"  Downloading transformers model (this will skip if cached)...")
     try:
-        cache_dir = os.path.join(model_dir, "transformers")
-        os.makedirs(cache_dir, exist_ok=True)
-        
-        # Try loading tokenizer first (smaller, faster check)
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name,
-            cache_dir=cache_dir,
-            resume_download=True
-        )
-        
-        # Load model with progress
-        model = AutoModelForSeq2SeqLM.from_pretrained(
-            model_name,
-            cache_dir=cache_dir,
-            resume_download=True
-        )
-        
-        print(f"  ✓ Transformers model loaded")
+        download_hub_snapshot(model_dir, model_name)
+        print(f"  ✓ Transformers model downloaded")
         return True
     except Exception as e:
-        print(f"  ✗ Error loading transformers model: {e}")
+        print(f"  ✗ Error downloading transformers model: {e}")
+        return False
+
+
+def convert_nllb_ct2(model_dir, model_name, output_subdir):
+    """Convert an NLLB checkpoint to an int8 CTranslate2 model (skipped if already converted)"""
+    output_dir = os.path.join(model_dir, output_subdir)
+    if ctranslate2 is None:
+        print(f"  ctranslate2 not installed, skipping CTranslate2 conversion")
+        return True
+    if os.path.exists(os.path.join(output_dir, "model.bin")):
+        print(f"  ✓ CTranslate2 model already exists")
+        return True
+    
+    print(f"  Converting {model_name} to CTranslate2 int8...")
+    try:
+        snapshot_path = download_hub_snapshot(model_dir, model_name)
+        converter = ctranslate2.converters.TransformersConverter(snapshot_path, low_cpu_mem_usage=True)
+        converter.convert(output_dir, quantization="int8", force=True)
+        print(f"  ✓ CTranslate2 model written to {output_dir}")
+        return True
+    except Exception as e:
+        print(f"  ✗ Error converting translation model: {e}")
         return False
 
 
 def download_emotion_model(model_dir, model_name):
     """Download emotion detection model"""
-    print(f"  Loading emotion model (this will download if not cached)...")
+    print(f"  Downloading emotion model (this will skip if cached)...")
     try:
-        cache_dir = os.path.join(model_dir, "transformers")
-        os.makedirs(cache_dir, exist_ok=True)
-        
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name,
-            cache_dir=cache_dir,
-            resume_download=True
-        )
-        
-        model = AutoModel.from_pretrained(
-            model_name,
-            cache_dir=cache_dir,
-            resume_download=True
-        )
-        
-        print(f"  ✓ Emotion model loaded")
+        download_hub_snapshot(model_dir, model_name)
+        print(f"  ✓ Emotion model downloaded")
         return True
     except Exception as e:
-        print(f"  ✗ Error loading emotion model: {e}")
+        print(f"  ✗ Error downloading emotion model: {e}")
         return False
 
 
@@ -210,11 +317,12 @@ def download_model(model_key, model_dir, force=False):
     # Download based on model type
     success = False
     if model_key == "wav2lip":
-        success = download_wav2lip(model_dir, model_config["url"])
+        success = download_wav2lip(model_dir, model_config["url"], sha256=model_config.get("sha256"))
     elif model_key == "whisper":
         success = download_whisper(model_dir, model_config["name"])
     elif model_key == "nllb":
         success = download_transformers_model(model_dir, model_config["name"])
+        success = success and convert_nllb_ct2(model_dir, model_config["ct2_source"], model_config["ct2_dir"])
     elif model_key == "emotion":
         success = download_emotion_model(model_dir, model_config["name"])
     elif model_key == "xtts":
@@ -257,6 +365,7 @@ def main():
     print("Model Downloader for Dubbing Pipeline")
     print("=" * 60)
     print(f"Model directory: {model_dir}")
+    print(f"HuggingFace cache: {resolve_hf_cache_dir(str(model_dir))}")
     print(f"Available disk space: {available_space:.2f} GB")
     print(f"Estimated total size: {total_size:.2f} GB")
     print("=" * 60)
@@ -275,10 +384,12 @@ def main():
     else:
         models_to_download = [args.model]
     
-    # Download models
-    results = {}
-    for model_key in models_to_download:
-        results[model_key] = download_model(model_key, str(model_dir), args.force)
+    # Download models concurrently (network-bound, so threads overlap well)
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        results = dict(zip(
+            models_to_download,
+            executor.map(lambda key: download_model(key, str(model_dir), args.force), models_to_download)
+        ))
     
     # Summary
     print("\n" + "=" * 60)
@@ -297,18 +408,7 @@ def main():
         print("\n✓ All models downloaded successfully!")
         
         # Show disk usage
-        model_size = sum(
-            os.path.getsize(os.path.join(model_dir, f))
-            for f in os.listdir(model_dir)
-            if os.path.isfile(os.path.join(model_dir, f))
-        )
-        for root, dirs, files in os.walk(model_dir):
-            for file in files:
-                filepath = os.path.join(root, file)
-                try:
-                    model_size += os.path.getsize(filepath)
-                except:
-                    pass
+        model_size = tree_size(model_dir)
         
         print(f"Total disk usage: {model_size / (1024**3):.2f} GB")
 
@@ -1,2 +1,11 @@
 # Services package
 
+import os
+
+# Keep torch.compile's inductor cache next to the models (a mounted volume in Docker) so
+# compiled kernels/graphs survive container restarts. Must be set before torch.compile runs.
+os.environ.setdefault(
+    "TORCHINDUCTOR_CACHE_DIR",
+    os.path.join(os.path.abspath(os.getenv("MODEL_CACHE_DIR", "./models")), "torchinductor")
+)
+os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
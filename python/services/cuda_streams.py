@@ -0,0 +1,49 @@
+"""
+CUDA Stream Management
+Gives each model its own CUDA stream so kernels from different endpoints can overlap
+"""
+
+import logging
+from contextlib import contextmanager
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Interactive, latency-sensitive models get high priority; bulk models use normal priority
+HIGH_PRIORITY_MODELS = {"emotion", "translate"}
+
+model_streams = {}
+
+
+def create_model_stream(name: str, device: str):
+    """Create a dedicated CUDA stream for a model (no-op on CPU)"""
+    if device != "cuda":
+        return None
+
+    # Lower number means higher priority
+    priority = -1 if name in HIGH_PRIORITY_MODELS else 0
+    stream = torch.cuda.Stream(priority=priority)
+    model_streams[name] = stream
+    logger.info(f"Created CUDA stream for {name} (priority {priority})")
+    return stream
+
+
+@contextmanager
+def model_stream(name: str):
+    """
+    Run the enclosed GPU work on the model's stream
+
+    The model stream first waits for work already queued by the caller, and the
+    caller's stream waits for the model stream on exit, so results are safe to use
+    afterwards. Falls through to the current stream if no stream was created.
+    """
+    stream = model_streams.get(name)
+    if stream is None:
+        yield None
+        return
+
+    caller_stream = torch.cuda.current_stream()
+    stream.wait_stream(caller_stream)
+    with torch.cuda.stream(stream):
+        yield stream
+    caller_stream.wait_stream(stream)
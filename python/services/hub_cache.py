@@ -0,0 +1,57 @@
+"""
+HuggingFace Cache Helpers
+Resolves the shared Hub cache so replicas reuse already-downloaded weights
+"""
+
+import os
+import logging
+import importlib.util
+
+logger = logging.getLogger(__name__)
+
+
+def enable_hf_transfer():
+    """
+    Switch huggingface_hub to the multi-connection hf_transfer downloader
+
+    Must run before huggingface_hub is imported. Only enabled when hf_transfer is
+    installed, since huggingface_hub refuses to download if the flag is set without it.
+    """
+    if importlib.util.find_spec("hf_transfer") is not None:
+        os.environ.setdefault("HF_HUB_ENABLE_HF_TRANSFER", "1")
+
+
+def resolve_hf_cache_dir(model_dir: str) -> str:
+    """
+    Resolve the HuggingFace cache directory
+
+    Prefers an explicitly configured Hub cache (HF_HUB_CACHE / HUGGINGFACE_HUB_CACHE,
+    then HF_HOME/hub), e.g. an NFS mount shared by all replicas, and falls back to
+    <model_dir>/transformers.
+    """
+    for env_var in ("HF_HUB_CACHE", "HUGGINGFACE_HUB_CACHE"):
+        if os.environ.get(env_var):
+            cache_dir, source = os.environ[env_var], env_var
+            break
+    else:
+        if os.environ.get("HF_HOME"):
+            cache_dir, source = os.path.join(os.environ["HF_HOME"], "hub"), "HF_HOME"
+        else:
+            cache_dir, source = os.path.join(model_dir, "transformers"), "model directory"
+
+    os.makedirs(cache_dir, exist_ok=True)
+    logger.info(f"Using HuggingFace cache ({source}): {cache_dir}")
+    return cache_dir
+
+
+def from_pretrained_cached(cls, model_name: str, **kwargs):
+    """
+    Load a pretrained tokenizer/model, trying the local cache before the Hub
+
+    A warm cache then never costs a network round trip at startup.
+    """
+    try:
+        return cls.from_pretrained(model_name, local_files_only=True, **kwargs)
+    except OSError:
+        logger.info(f"{model_name} not found in local cache, downloading from the Hub")
+        return cls.from_pretrained(model_name, **kwargs)
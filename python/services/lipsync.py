@@ -4,7 +4,10 @@ Synchronizes lip movements with audio using Wav2Lip model
 """
 
 import os
+import heapq
+import asyncio
 import logging
+import subprocess
 import torch
 import cv2
 import numpy as np
@@ -12,6 +15,11 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from pathlib import Path
 
+try:
+    import av
+except ImportError:  # Fall back to the ffmpeg CLI
+    av = None
+
 logger = logging.getLogger(__name__)
 
 lipsync_router = APIRouter()
@@ -49,17 +57,111 @@ def load_lipsync_model(model_dir: str):
         
         lipsync_device = "cuda" if torch.cuda.is_available() else "cpu"
         
-        # For now, we'll mark the model as "available" if checkpoint exists
-        # Actual model loading would happen here
-        logger.info("Wav2Lip checkpoint found (full implementation requires additional setup)")
+        # Memory-map the checkpoint so weights are paged in on demand instead of
+        # unpickled into RAM; weights_only skips the unpickler's arbitrary-code path
+        try:
+            checkpoint = torch.load(
+                checkpoint_path, map_location=lipsync_device, mmap=True, weights_only=True
+            )
+        except RuntimeError as e:
+            # Legacy (non-zip) checkpoints can't be memory-mapped
+            logger.warning(f"Could not memory-map Wav2Lip checkpoint, loading normally: {e}")
+            checkpoint = torch.load(checkpoint_path, map_location=lipsync_device, weights_only=True)
+        
+        # Keep the weights; the Wav2Lip architecture itself is not wired up yet
+        lipsync_model = checkpoint.get("state_dict", checkpoint)
+        logger.info("Wav2Lip checkpoint loaded (full implementation requires additional setup)")
         
-        return True  # Placeholder
+        return lipsync_model
     
     except Exception as e:
         logger.error(f"Error loading Wav2Lip model: {e}")
         return None
 
 
+def _stream_end_time(container, stream):
+    """Duration of a stream in seconds (falls back to the container duration)"""
+    if stream.duration is not None and stream.time_base is not None:
+        return float(stream.duration * stream.time_base)
+    if container.duration is not None:
+        return container.duration / av.time_base
+    return None
+
+
+def replace_audio_track(video_path: str, audio_path: str, output_path: str):
+    """
+    Replace the audio track of a video in-process with PyAV
+    
+    Equivalent to `ffmpeg -i video -i audio -c:v copy -c:a aac -map 0:v:0 -map 1:a:0 -shortest`:
+    video packets are remuxed without re-encoding, audio is encoded to AAC, and both
+    streams are cut at the end of the shorter one.
+    """
+    with av.open(video_path) as in_video, av.open(audio_path) as in_audio, \
+            av.open(output_path, "w") as out:
+        video_in = in_video.streams.video[0]
+        audio_in = in_audio.streams.audio[0]
+        
+        video_out = out.add_stream(template=video_in)
+        audio_out = out.add_stream("aac", rate=audio_in.rate)
+        audio_out.layout = audio_in.layout.name
+        
+        ends = [t for t in (_stream_end_time(in_video, video_in), _stream_end_time(in_audio, audio_in)) if t]
+        end_time = min(ends) if ends else None
+        
+        def video_packets():
+            for packet in in_video.demux(video_in):
+                # Flush packets carry no data
+                if packet.dts is None:
+                    continue
+                t = float(packet.dts * packet.time_base)
+                if end_time is not None and t >= end_time:
+                    break
+                packet.stream = video_out
+                yield t, 0, packet
+        
+        def audio_packets():
+            for frame in in_audio.decode(audio_in):
+                if end_time is not None and frame.time is not None and frame.time >= end_time:
+                    break
+                frame.pts = None
+                for packet in audio_out.encode(frame):
+                    yield float(packet.pts * audio_out.time_base), 1, packet
+            for packet in audio_out.encode(None):
+                yield float(packet.pts * audio_out.time_base), 1, packet
+        
+        # Interleave both streams by timestamp so the muxer does not buffer a whole track
+        for _, _, packet in heapq.merge(video_packets(), audio_packets(), key=lambda item: item[:2]):
+            out.mux(packet)
+
+
+def replace_audio_track_ffmpeg(video_path: str, audio_path: str, output_path: str):
+    """Replace the audio track of a video using the ffmpeg CLI"""
+    cmd = [
+        "ffmpeg",
+        "-i", video_path,
+        "-i", audio_path,
+        "-c:v", "copy",
+        "-c:a", "aac",
+        "-map", "0:v:0",
+        "-map", "1:a:0",
+        "-shortest",
+        "-y",
+        output_path
+    ]
+    
+    result = subprocess.run(
+        cmd,
+        capture_output=True,
+        text=True
+    )
+    
+    if result.returncode != 0:
+        raise HTTPException(
+            status_code=500,
+            detail=f"FFmpeg failed: {result.stderr}"
+        )
+
+
 @lipsync_router.post("")
 async def sync_lips(request: LipSyncRequest):
     """
@@ -115,35 +217,14 @@ async def sync_lips(request: LipSyncRequest):
         logger.warning("Full Wav2Lip implementation requires additional dependencies")
         logger.warning("Using basic audio replacement for now")
         
-        # Basic implementation: replace audio in video using ffmpeg
+        # Basic implementation: replace audio in video without re-encoding the video
         # This is a placeholder - full implementation would use Wav2Lip model
-        import subprocess
-        
-        cmd = [
-            "ffmpeg",
-            "-i", request.video_path,
-            "-i", request.audio_path,
-            "-c:v", "copy",
-            "-c:a", "aac",
-            "-map", "0:v:0",
-            "-map", "1:a:0",
-            "-shortest",
-            "-y",
-            request.output_path
-        ]
-        
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True
+        # Run off the event loop so other requests keep being served
+        replace = replace_audio_track if av is not None else replace_audio_track_ffmpeg
+        await asyncio.to_thread(
+            replace, request.video_path, request.audio_path, request.output_path
         )
         
-        if result.returncode != 0:
-            raise HTTPException(
-                status_code=500,
-                detail=f"FFmpeg failed: {result.stderr}"
-            )
-        
         if not os.path.exists(request.output_path):
             raise HTTPException(
                 status_code=500,
@@ -0,0 +1,139 @@
+"""
+Model Worker Processes
+Runs a model in its own spawned process (own CUDA context, own GIL) and forwards calls to it
+"""
+
+import os
+import asyncio
+import logging
+import itertools
+import threading
+import multiprocessing as mp
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(conn, loader, handler, loader_args, cuda_device):
+    """Entry point of the worker process: load the model once, then serve calls in order"""
+    if cuda_device is not None:
+        # Scope the worker to one GPU before CUDA is initialised
+        os.environ["CUDA_VISIBLE_DEVICES"] = str(cuda_device)
+
+    try:
+        state = loader(*loader_args)
+    except Exception as e:
+        conn.send((None, False, f"{type(e).__name__}: {e}"))
+        return
+    conn.send((None, True, None))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        request_id, args = message
+        try:
+            conn.send((request_id, True, handler(state, *args)))
+        except Exception as e:
+            # Exceptions are not always picklable, send the message instead
+            conn.send((request_id, False, f"{type(e).__name__}: {e}"))
+
+
+class ModelWorker:
+    """
+    Proxy for a model living in a dedicated process
+
+    `loader(*loader_args)` runs once in the worker and its return value is passed as
+    the first argument to every `handler(state, *args)` call. Both must be importable
+    module-level functions (the worker is started with the spawn method).
+    """
+
+    def __init__(self, name, loader, handler, loader_args=(), cuda_device=None):
+        self.name = name
+        self.loader = loader
+        self.handler = handler
+        self.loader_args = loader_args
+        self.cuda_device = cuda_device
+        self.process = None
+        self._conn = None
+        self._send_lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._pending = {}
+
+    def start(self):
+        """Spawn the worker and block until its model is loaded"""
+        ctx = mp.get_context("spawn")
+        self._conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.loader, self.handler, self.loader_args, self.cuda_device),
+            name=f"{self.name}-worker",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+        _, ok, error = self._conn.recv()
+        if not ok:
+            self.process.join()
+            raise RuntimeError(f"{self.name} worker failed to load: {error}")
+
+        threading.Thread(target=self._read_responses, name=f"{self.name}-reader", daemon=True).start()
+        logger.info(f"{self.name} worker started (pid {self.process.pid})")
+        return self
+
+    def _read_responses(self):
+        """Resolve pending calls as the worker answers them"""
+        while True:
+            try:
+                request_id, ok, payload = self._conn.recv()
+            except (EOFError, OSError):
+                break
+
+            loop, fut = self._pending.pop(request_id)
+            if ok:
+                loop.call_soon_threadsafe(_set_result, fut, payload)
+            else:
+                loop.call_soon_threadsafe(_set_exception, fut, RuntimeError(payload))
+
+        # Worker exited: fail whatever is still waiting
+        for request_id in list(self._pending):
+            loop, fut = self._pending.pop(request_id)
+            loop.call_soon_threadsafe(_set_exception, fut, RuntimeError(f"{self.name} worker exited"))
+
+    async def call(self, *args):
+        """Run handler(state, *args) in the worker and await its result"""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self._send_lock:
+            request_id = next(self._request_ids)
+            self._pending[request_id] = (loop, fut)
+            self._conn.send((request_id, args))
+        return await fut
+
+    def stop(self):
+        """Ask the worker to exit and wait for it"""
+        if self.process is None:
+            return
+        try:
+            with self._send_lock:
+                self._conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process = None
+
+
+def _set_result(fut, result):
+    if not fut.done():
+        fut.set_result(result)
+
+
+def _set_exception(fut, error):
+    if not fut.done():
+        fut.set_exception(error)
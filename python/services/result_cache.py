@@ -0,0 +1,53 @@
+"""
+Result Caches
+Small in-process LRU caches for repeated requests (character names, recurring lines)
+"""
+
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Least-recently-used mapping with a fixed number of entries
+
+    Only touched from the event loop thread, so no locking is needed.
+    maxsize=0 disables caching. `on_evict(value)`, if given, is called for every
+    value that leaves the cache (eviction, pop or clear), e.g. to delete a file.
+    """
+
+    def __init__(self, maxsize: int, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return the cached value (marking it recently used) or None"""
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entry when full"""
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            _, evicted = self._entries.popitem(last=False)
+            self._evicted(evicted)
+
+    def pop(self, key):
+        """Drop an entry if present"""
+        value = self._entries.pop(key, None)
+        if value is not None:
+            self._evicted(value)
+
+    def clear(self):
+        for value in self._entries.values():
+            self._evicted(value)
+        self._entries.clear()
+
+    def _evicted(self, value):
+        if self.on_evict is not None:
+            self.on_evict(value)
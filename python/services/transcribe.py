@@ -1,21 +1,38 @@
 """
 Whisper Transcription Service
-Provides audio transcription with word-level timestamps
+Provides audio transcription with word-level timestamps using faster-whisper (CTranslate2)
 """
 
 import os
 import time
+import struct
+import asyncio
 import logging
-import whisper
-# import torch
+from concurrent.futures import ThreadPoolExecutor
+import soundfile as sf
+from faster_whisper import WhisperModel, decode_audio
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from pathlib import Path
 import tempfile
+from services.model_worker import ModelWorker
 
 logger = logging.getLogger(__name__)
 
 transcribe_router = APIRouter()
 whisper_model = None
+# Optional dedicated process for Whisper (own CUDA context and GIL)
+whisper_worker = None
+
+WHISPER_WORKER_PROCESS = os.getenv("WHISPER_WORKER_PROCESS", "0") == "1"
+WHISPER_WORKER_GPU = os.getenv("WHISPER_WORKER_GPU")  # CUDA_VISIBLE_DEVICES for the worker
+
+UPLOAD_CHUNK_SIZE = 1 << 20
+WHISPER_SAMPLE_RATE = 16000
+
+# Concurrent transcriptions on the model (CTranslate2 workers); audio decoding runs on
+# separate threads, so the next request's decode overlaps the current transcription
+WHISPER_NUM_WORKERS = int(os.getenv("WHISPER_NUM_WORKERS", "1"))
+whisper_executor = ThreadPoolExecutor(max_workers=WHISPER_NUM_WORKERS, thread_name_prefix="whisper")
 
 
 def load_whisper_model(model_dir: str, device: str):
@@ -23,11 +40,17 @@ def load_whisper_model(model_dir: str, device: str):
     global whisper_model
     try:
         model_name = "large-v3"
-        logger.info(f"Loading Whisper model: {model_name}")
-        whisper_model = whisper.load_model(
+        # INT8 weights with FP16 activations on GPU; int8_float16 is not available on CPU
+        compute_type = "int8_float16" if device == "cuda" else "int8"
+        logger.info(f"Loading Whisper model: {model_name} ({compute_type})")
+        whisper_model = WhisperModel(
             model_name,
             device=device,
-            download_root=os.path.join(model_dir, "whisper")
+            compute_type=compute_type,
+            download_root=os.path.join(model_dir, "faster-whisper"),
+            # Use every core for CPU decoding (CTranslate2 defaults to 4 threads)
+            cpu_threads=os.cpu_count() if device == "cpu" else 0,
+            num_workers=WHISPER_NUM_WORKERS
         )
         logger.info("Whisper model loaded successfully")
         return whisper_model
@@ -36,6 +59,83 @@ def load_whisper_model(model_dir: str, device: str):
         raise
 
 
+def start_whisper_worker(model_dir: str, device: str):
+    """Load Whisper in a dedicated worker process instead of in the API process"""
+    global whisper_worker
+    whisper_worker = ModelWorker(
+        "whisper",
+        load_whisper_model,
+        run_transcription,
+        loader_args=(model_dir, device),
+        cuda_device=WHISPER_WORKER_GPU
+    ).start()
+    return whisper_worker
+
+
+def stop_whisper_worker():
+    """Stop the Whisper worker process if one is running"""
+    global whisper_worker
+    if whisper_worker is not None:
+        whisper_worker.stop()
+        whisper_worker = None
+
+
+def is_whisper_wav(header: bytes) -> bool:
+    """Check for a 16 kHz mono WAV header (Whisper's input format, no resampling needed)"""
+    return (
+        len(header) >= 28
+        and header[:4] == b"RIFF"
+        and header[8:12] == b"WAVE"
+        and header[12:16] == b"fmt "
+        and struct.unpack("<H", header[22:24])[0] == 1
+        and struct.unpack("<I", header[24:28])[0] == WHISPER_SAMPLE_RATE
+    )
+
+
+def read_whisper_wav(fileobj):
+    """Read a 16 kHz mono WAV into the float32 array Whisper expects"""
+    audio, _ = sf.read(fileobj, dtype="float32")
+    return audio
+
+
+def run_transcription(model, audio):
+    """
+    Transcribe audio and format segments with word-level timestamps
+    
+    `audio` is a file path or a float32 16 kHz mono array. Runs either in the API
+    process or inside the Whisper worker process.
+    """
+    # Transcribe with word-level timestamps (segments are decoded lazily while iterating)
+    result, info = model.transcribe(
+        audio,
+        language="en",  # Can be auto-detected by setting to None
+        word_timestamps=True,
+        task="transcribe",
+        beam_size=5,
+        vad_filter=True
+    )
+    
+    # Format segments
+    segments = []
+    for i, seg in enumerate(result):
+        segments.append({
+            "id": i,
+            "start": round(seg.start, 2),
+            "end": round(seg.end, 2),
+            "text": seg.text.strip(),
+            "words": [
+                {
+                    "word": word.word,
+                    "start": round(word.start, 2),
+                    "end": round(word.end, 2)
+                }
+                for word in seg.words
+            ] if seg.words else []
+        })
+    
+    return {"segments": segments, "language": info.language}
+
+
 @transcribe_router.post("")
 async def transcribe_audio(file: UploadFile = File(...)):
     """
@@ -47,7 +147,7 @@ async def transcribe_audio(file: UploadFile = File(...)):
     Returns:
         JSON with segments containing text, start, end timestamps
     """
-    if whisper_model is None:
+    if whisper_model is None and whisper_worker is None:
         raise HTTPException(status_code=503, detail="Whisper model not loaded")
     
     # Validate file type
@@ -57,48 +157,39 @@ async def transcribe_audio(file: UploadFile = File(...)):
     # Save uploaded file temporarily
     temp_path = None
     try:
-        # Create temp file
-        suffix = Path(file.filename).suffix or ".wav"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-            temp_path = tmp_file.name
-            content = await file.read()
-            tmp_file.write(content)
+        header = await file.read(28)
+        await file.seek(0)
+        if is_whisper_wav(header):
+            # Already Whisper's format: read samples straight from the upload, no temp file or decode
+            audio = await asyncio.to_thread(read_whisper_wav, file.file)
+        else:
+            # Create temp file
+            suffix = Path(file.filename).suffix or ".wav"
+            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+                temp_path = tmp_file.name
+                # Copy in 1 MiB chunks so memory stays flat regardless of upload size
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    tmp_file.write(chunk)
+            # Decode/resample on a CPU thread while the model serves other requests
+            audio = await asyncio.to_thread(decode_audio, temp_path, sampling_rate=WHISPER_SAMPLE_RATE)
         
         logger.info(f"Transcribing audio file: {file.filename}")
         start_time = time.time()
         
-        # Transcribe with word-level timestamps
-        result = whisper_model.transcribe(
-            temp_path,
-            language="en",  # Can be auto-detected by setting to None
-            word_timestamps=True,
-            task="transcribe"
-        )
+        if whisper_worker is not None:
+            result = await whisper_worker.call(audio)
+        else:
+            # Decoding is CPU/GPU-bound and releases the GIL; keep it off the event loop
+            result = await asyncio.get_running_loop().run_in_executor(
+                whisper_executor, run_transcription, whisper_model, audio
+            )
         
         processing_time = time.time() - start_time
         logger.info(f"Transcription completed in {processing_time:.2f} seconds")
         
-        # Format segments
-        segments = []
-        for i, seg in enumerate(result["segments"]):
-            segments.append({
-                "id": i,
-                "start": round(seg["start"], 2),
-                "end": round(seg["end"], 2),
-                "text": seg["text"].strip(),
-                "words": [
-                    {
-                        "word": word["word"],
-                        "start": round(word["start"], 2),
-                        "end": round(word["end"], 2)
-                    }
-                    for word in seg.get("words", [])
-                ] if "words" in seg else []
-            })
-        
         return {
-            "segments": segments,
-            "language": result.get("language", "en"),
+            "segments": result["segments"],
+            "language": result["language"],
             "processing_time": round(processing_time, 2)
         }
     
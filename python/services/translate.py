@@ -4,17 +4,71 @@ Provides translation from English to Uzbek using Facebook NLLB-200 model
 """
 
 import os
+import asyncio
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import torch
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from pydantic import BaseModel, Field
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, BitsAndBytesConfig
+from services.cuda_streams import model_stream
+from services.hub_cache import resolve_hf_cache_dir, from_pretrained_cached
+from services.result_cache import ResultCache
+
+try:
+    import ctranslate2
+except ImportError:
+    ctranslate2 = None
 
 logger = logging.getLogger(__name__)
 
+# "ct2" serves the int8 CTranslate2 conversion made by download_models.py, "hf" the
+# transformers model; "auto" uses ct2 whenever the converted model is present
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "auto")
+CT2_MODEL_SUBDIR = "nllb-ct2-int8"
+
+# Micro-batching: concurrent requests arriving within a short window share one generate call
+TRANSLATE_MAX_BATCH = int(os.getenv("TRANSLATE_MAX_BATCH", "16"))
+TRANSLATE_MAX_WAIT_MS = float(os.getenv("TRANSLATE_MAX_WAIT_MS", "10"))
+# Length-sorted sub-batch size, caps padding waste when short and long lines are mixed
+TRANSLATE_SUB_BATCH = int(os.getenv("TRANSLATE_SUB_BATCH", "8"))
+# torch.compile the transformers model's forward on CUDA (fused kernels for each decoding step)
+TRANSLATE_COMPILE = os.getenv("TRANSLATE_COMPILE", "1") == "1"
+# Transformers backend weights: "int8" (bitsandbytes on GPU, dynamic quantization on CPU),
+# "fp16" (fp16 on GPU, bf16 on CPUs with native bf16) or "fp32"
+NLLB_QUANT = os.getenv("NLLB_QUANT", "fp16")
+# Translations of repeated (text, source, target, beams) requests; decoding is deterministic
+TRANSLATE_CACHE_SIZE = int(os.getenv("TRANSLATE_CACHE_SIZE", "4096"))
+# Hard cap on generated tokens; the per-batch limit is derived from the input length
+TRANSLATE_MAX_TOKENS = 200
+
 translate_router = APIRouter()
-translation_model = None
+translation_model = None  # transformers model or ctranslate2.Translator
 translation_tokenizer = None
+translation_backend = None
+
+# Alternative code mappings for Uzbek targets, and English codes tried for unknown sources
+UZBEK_ALTERNATIVES = {
+    'uzn_Latn': ['uzn_Latn', 'uzb', 'uz_Latn', 'uz', 'uzb_Latin'],
+    'uzb_Cyrl': ['uzb_Cyrl', 'uz_Cyrl', 'uzb_Cyrillic']
+}
+ENGLISH_ALTERNATIVES = ['eng_Latn', 'eng', 'en', 'en_Latn']
+
+# Language lookup tables, built once when the tokenizer is loaded
+translation_lang_ids = None  # language code -> token id
+resolved_target_langs = {}  # requested code -> (code used, token id)
+source_lang_fallback = None
+
+translation_queue = None
+# Single worker keeps decoding off the event loop thread
+translate_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="translate")
+# The Rust tokenizer errors on concurrent use ("Already borrowed"); encode and decode
+# happen on different threads
+tokenizer_lock = threading.Lock()
+# Lazy loads run off the event loop; concurrent first requests must not load twice
+load_lock = threading.Lock()
+translation_cache = ResultCache(TRANSLATE_CACHE_SIZE)
 
 
 class TranslationRequest(BaseModel):
@@ -22,11 +76,62 @@ class TranslationRequest(BaseModel):
     source_lang: str = "eng_Latn"
     target_lang: str = "uzn_Latn"  # or "uzb_Cyrl" for Cyrillic script
     emotion: str = "neutral"  # Currently unused, reserved for future use
+    beams: int = Field(1, ge=1, le=8)  # 1 = greedy decoding (fastest); raise for quality-critical lines
+
+
+def resolve_translation_backend(model_dir: str):
+    """Pick the translation backend; returns (backend, path of the CTranslate2 model)"""
+    ct2_path = os.path.join(model_dir, CT2_MODEL_SUBDIR)
+    if TRANSLATION_BACKEND == "hf":
+        return "hf", ct2_path
+    
+    ct2_available = ctranslate2 is not None and os.path.isdir(ct2_path)
+    if TRANSLATION_BACKEND == "ct2" and not ct2_available:
+        raise RuntimeError(
+            f"TRANSLATION_BACKEND=ct2 but no CTranslate2 model at {ct2_path} "
+            "(run download_models.py --model nllb with ctranslate2 installed)"
+        )
+    return ("ct2" if ct2_available else "hf"), ct2_path
+
+
+def translation_dtype(device: str):
+    """Half precision for the transformers backend: fp16 on GPU, bf16 on CPUs with native bf16"""
+    if device == "cuda":
+        return torch.float16
+    try:
+        if torch.ops.mkldnn._is_mkldnn_bf16_supported():
+            return torch.bfloat16
+    except (AttributeError, RuntimeError):
+        pass
+    return torch.float32
+
+
+def build_language_tables(tokenizer):
+    """Precompute language code lookups so requests don't scan the tokenizer's code map"""
+    global translation_lang_ids, resolved_target_langs, source_lang_fallback
+    
+    if not hasattr(tokenizer, 'lang_code_to_id'):
+        translation_lang_ids, resolved_target_langs, source_lang_fallback = None, {}, None
+        return
+    
+    lang_ids = dict(tokenizer.lang_code_to_id)
+    resolved = {code: (code, token_id) for code, token_id in lang_ids.items()}
+    for requested, alternatives in UZBEK_ALTERNATIVES.items():
+        if requested in resolved:
+            continue
+        for alt_code in alternatives:
+            if alt_code in lang_ids:
+                resolved[requested] = (alt_code, lang_ids[alt_code])
+                break
+    
+    translation_lang_ids = lang_ids
+    resolved_target_langs = resolved
+    source_lang_fallback = next((code for code in ENGLISH_ALTERNATIVES if code in lang_ids), None)
 
 
 def load_translation_model(model_dir: str, device: str, force_reload: bool = False):
     """Load NLLB translation model with memory optimizations (lazy loading)"""
-    global translation_model, translation_tokenizer
+    global translation_model, translation_tokenizer, translation_backend
     
     # Skip if already loaded (unless force_reload)
     if translation_model is not None and translation_tokenizer is not None and not force_reload:
@@ -39,15 +144,36 @@ def load_translation_model(model_dir: str, device: str, force_reload: bool = Fal
         model_name = "facebook/nllb-200-distilled-600M"
         logger.info(f"Loading translation model: {model_name} (optimized for memory)")
         
-        cache_dir = os.path.join(model_dir, "transformers")
-        os.makedirs(cache_dir, exist_ok=True)
+        cache_dir = resolve_hf_cache_dir(model_dir)
         
-        translation_tokenizer = AutoTokenizer.from_pretrained(
+        # Rust tokenizer: much faster than SentencePiece in Python and releases the GIL
+        translation_tokenizer = from_pretrained_cached(
+            AutoTokenizer,
             model_name,
-            cache_dir=cache_dir
+            cache_dir=cache_dir,
+            use_fast=True
         )
+        if not translation_tokenizer.is_fast:
+            logger.warning("Fast tokenizer unavailable for translation model, using the slow one")
+        build_language_tables(translation_tokenizer)
+        translation_cache.clear()
+        
+        backend, ct2_path = resolve_translation_backend(model_dir)
+        if backend == "ct2":
+            # int8 weights: fastest on CPU and ~4x smaller than fp32, BLEU within noise
+            translation_model = ctranslate2.Translator(
+                ct2_path,
+                device=device,
+                compute_type="int8" if device == "cpu" else "int8_float16",
+                inter_threads=1,
+                intra_threads=os.cpu_count()
+            )
+            translation_backend = backend
+            logger.info(f"Translation model loaded successfully (CTranslate2: {ct2_path})")
+            return translation_model
         
-        # Memory-optimized loading
+        # Memory-optimized loading; half precision halves memory (BLEU/COMET within noise)
+        quant = NLLB_QUANT
         load_kwargs = {
             "cache_dir": cache_dir,
             "low_cpu_mem_usage": True,  # Reduces peak memory during loading
@@ -57,17 +183,64 @@ def load_translation_model(model_dir: str, device: str, force_reload: bool = Fal
         if device == "cuda":
             load_kwargs["device_map"] = "auto"
         
-        translation_model = AutoModelForSeq2SeqLM.from_pretrained(
+        if device == "cuda" and quant == "int8":
+            try:
+                import bitsandbytes  # noqa: F401
+                # Threshold 0 keeps every matmul in int8 (no fp16 outlier decomposition)
+                load_kwargs["quantization_config"] = BitsAndBytesConfig(
+                    load_in_8bit=True, llm_int8_threshold=0.0
+                )
+            except ImportError:
+                logger.warning("bitsandbytes not installed, loading translation model in fp16")
+                quant = "fp16"
+        
+        # Dynamic quantization on CPU starts from fp32 weights
+        dtype = translation_dtype(device) if quant == "fp16" or (quant == "int8" and device == "cuda") else torch.float32
+        load_kwargs["torch_dtype"] = dtype
+        
+        translation_model = from_pretrained_cached(
+            AutoModelForSeq2SeqLM,
             model_name,
             **load_kwargs
         )
+        logger.info(f"Translation model quantization: {quant} ({dtype})")
         
         # Move to device if not using device_map
-        if device != "cuda" or "device_map" not in load_kwargs:
+        if "device_map" not in load_kwargs:
             translation_model = translation_model.to(device)
         
+        if quant == "int8" and device == "cpu":
+            translation_model = torch.quantization.quantize_dynamic(
+                translation_model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        
         # Set to evaluation mode to save memory
         translation_model.eval()
+        translation_backend = backend
+        
+        # Reuse past keys/values across decoding steps instead of re-running the prefix
+        translation_model.generation_config.use_cache = True
+        
+        # Compile the forward pass that generate() calls once per decoding step
+        compiled = False
+        if device == "cuda" and TRANSLATE_COMPILE and quant != "int8":
+            torch.set_float32_matmul_precision("high")
+            eager_forward = translation_model.forward
+            try:
+                # Default mode: CUDA graphs ("reduce-overhead") would reuse output buffers
+                # across steps while generate()'s KV cache grows every step
+                translation_model.forward = torch.compile(
+                    eager_forward, mode="default", dynamic=True, fullgraph=False
+                )
+                # Warm up so the first request doesn't pay for compilation
+                warmup_translation()
+                compiled = True
+                logger.info("Translation model compiled")
+            except Exception as e:
+                logger.warning(f"torch.compile failed for translation model, using eager mode: {e}")
+                translation_model.forward = eager_forward
+        if device == "cuda" and not compiled:
+            warmup_translation()
         
         logger.info("Translation model loaded successfully")
         return translation_model
@@ -77,6 +250,38 @@ def load_translation_model(model_dir: str, device: str, force_reload: bool = Fal
         raise
 
 
+def lazy_load_translation_model():
+    """Load the translation model on first use (run in a worker thread)"""
+    with load_lock:
+        if translation_model is not None and translation_tokenizer is not None:
+            return
+        logger.info("Translation model not loaded, loading now...")
+        # Get config from environment (same as app.py)
+        model_dir = os.getenv("MODEL_CACHE_DIR", "./models")
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        load_translation_model(model_dir, device)
+        # Clean up memory after loading
+        import gc
+        gc.collect()
+        if device == "cuda":
+            torch.cuda.empty_cache()
+
+
+def warmup_translation():
+    """
+    Run one full-length generate with a ~64-token input
+    
+    Grows the KV cache to a near-maximal length once, so the CUDA caching allocator
+    already holds blocks of that size (and compiled graphs exist) before the
+    first request.
+    """
+    warmup_lang = "uzn_Latn"
+    generate_translations(
+        [" ".join(["warmup"] * 64)], "eng_Latn", warmup_lang,
+        translation_lang_ids[warmup_lang]
+    )
+
+
 @translate_router.post("")
 async def translate_text(request: TranslationRequest):
     """
@@ -90,16 +295,8 @@ async def translate_text(request: TranslationRequest):
     """
     # Lazy load model on first request to save startup memory
     if translation_model is None or translation_tokenizer is None:
-        logger.info("Translation model not loaded, loading now...")
-        # Get config from environment (same as app.py)
-        model_dir = os.getenv("MODEL_CACHE_DIR", "./models")
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        load_translation_model(model_dir, device)
-        # Clean up memory after loading
-        import gc
-        gc.collect()
-        if device == "cuda":
-            torch.cuda.empty_cache()
+        # Loading (and compile warmup) takes seconds; keep the event loop serving
+        await asyncio.to_thread(lazy_load_translation_model)
     
     if translation_model is None or translation_tokenizer is None:
         raise HTTPException(status_code=503, detail="Translation model not loaded")
@@ -109,99 +306,61 @@ async def translate_text(request: TranslationRequest):
         source_lang = request.source_lang
         target_lang = request.target_lang
         
-        # Get target language token ID
-        # Check if lang_code_to_id attribute exists
-        if not hasattr(translation_tokenizer, 'lang_code_to_id'):
+        if translation_lang_ids is None:
             logger.error("Tokenizer missing lang_code_to_id attribute")
             raise HTTPException(
                 status_code=500,
                 detail="Tokenizer missing lang_code_to_id attribute. Model may not be fully loaded."
             )
         
-        # Get available language codes for debugging
-        available_langs = list(translation_tokenizer.lang_code_to_id.keys())
-        logger.debug(f"Total available language codes: {len(available_langs)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Total available language codes: {len(translation_lang_ids)}")
         
-        # Try to get target language token ID, with fallbacks
-        target_token_id = None
-        original_target_lang = target_lang
-        
-        # Define alternative code mappings for Uzbek
-        uzbek_alternatives = {
-            'uzn_Latn': ['uzn_Latn', 'uzb', 'uz_Latn', 'uz', 'uzb_Latin'],
-            'uzb_Cyrl': ['uzb_Cyrl', 'uz_Cyrl', 'uzb_Cyrillic']
-        }
+        # Resolve target language (with Uzbek fallbacks) from the table built at load time
+        resolved = resolved_target_langs.get(target_lang)
         
-        # Try the requested code first
-        if target_lang in translation_tokenizer.lang_code_to_id:
-            target_token_id = translation_tokenizer.lang_code_to_id[target_lang]
-        else:
-            # Try alternatives
-            alternatives = uzbek_alternatives.get(target_lang, [target_lang])
-            for alt_code in alternatives:
-                if alt_code in translation_tokenizer.lang_code_to_id:
-                    target_token_id = translation_tokenizer.lang_code_to_id[alt_code]
-                    logger.info(f"Using alternative language code: {alt_code} (instead of {target_lang})")
-                    target_lang = alt_code  # Update to the code that worked
-                    break
-        
-        # If still not found, provide helpful error message
-        if target_token_id is None:
+        # If not found, provide helpful error message
+        if resolved is None:
+            available_langs = list(translation_lang_ids)
             # Find all Uzbek-related codes
             uzb_codes = [code for code in available_langs if 'uzb' in code.lower() or code.lower().startswith('uz')]
             uzb_codes = uzb_codes[:10]  # Limit to first 10
             
-            error_msg = f"Unsupported target language: {original_target_lang}.\n"
+            error_msg = f"Unsupported target language: {target_lang}.\n"
             if uzb_codes:
                 error_msg += f"Found Uzbek-related codes: {', '.join(uzb_codes)}.\n"
             error_msg += f"Total available codes: {len(available_langs)}. Please check NLLB documentation for correct code format."
             
-            logger.error(f"Language code not found. Requested: {original_target_lang}, Available Uzbek codes: {uzb_codes}")
+            logger.error(f"Language code not found. Requested: {target_lang}, Available Uzbek codes: {uzb_codes}")
             raise HTTPException(status_code=400, detail=error_msg)
         
+        if resolved[0] != target_lang:
+            logger.info(f"Using alternative language code: {resolved[0]} (instead of {target_lang})")
+        target_lang, target_token_id = resolved
+        
         logger.info(f"Translating from {source_lang} to {target_lang}")
         
-        # Validate source language code
-        if source_lang not in translation_tokenizer.lang_code_to_id:
-            # Try common alternatives for English
-            eng_alternatives = ['eng_Latn', 'eng', 'en', 'en_Latn']
-            for alt_code in eng_alternatives:
-                if alt_code in translation_tokenizer.lang_code_to_id:
-                    source_lang = alt_code
-                    logger.info(f"Using alternative source code: {alt_code}")
-                    break
-            else:
+        # Validate source language code (unknown codes fall back to English)
+        if source_lang not in translation_lang_ids:
+            if source_lang_fallback is None:
+                eng_codes = [c for c in translation_lang_ids if 'eng' in c.lower() or c.lower().startswith('en')]
                 raise HTTPException(
                     status_code=400,
-                    detail=f"Unsupported source language: {request.source_lang}. Available English codes: {[c for c in available_langs if 'eng' in c.lower() or c.lower().startswith('en')][:5]}"
+                    detail=f"Unsupported source language: {request.source_lang}. Available English codes: {eng_codes[:5]}"
                 )
+            source_lang = source_lang_fallback
+            logger.info(f"Using alternative source code: {source_lang}")
         
-        # Tokenize input
-        inputs = translation_tokenizer(
-            request.text,
-            return_tensors="pt",
-            padding=True,
-            src_lang=source_lang
-        )
-        
-        # Move to device
-        device = next(translation_model.parameters()).device
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-        
-        # Generate translation
-        translated_tokens = translation_model.generate(
-            **inputs,
-            forced_bos_token_id=target_token_id,
-            max_length=200,
-            num_beams=5,
-            early_stopping=True
-        )
-        
-        # Decode translation
-        translated_text = translation_tokenizer.batch_decode(
-            translated_tokens,
-            skip_special_tokens=True
-        )[0]
+        cache_key = (request.text, source_lang, target_lang, request.beams)
+        translated_text = translation_cache.get(cache_key)
+        if translated_text is None:
+            if translation_queue is None:
+                raise HTTPException(status_code=503, detail="Translation batcher not running")
+            
+            fut = asyncio.get_running_loop().create_future()
+            await translation_queue.put((request.text, source_lang, target_lang, target_token_id, request.beams, fut))
+            translated_text = await fut
+            translation_cache.put(cache_key, translated_text)
         
         logger.info(f"Translation completed: {len(request.text)} -> {len(translated_text)} chars")
         
@@ -219,6 +378,164 @@ async def translate_text(request: TranslationRequest):
         raise HTTPException(status_code=500, detail=f"Translation failed: {str(e)}")
 
 
+def max_output_tokens(input_length: int) -> int:
+    """Output budget for an input of input_length tokens (NLLB output is ~1.2x its input)"""
+    return min(TRANSLATE_MAX_TOKENS, int(input_length * 1.5) + 16)
+
+
+def tokenize_translations(texts, source_lang: str):
+    """Tokenize a batch for the loaded backend (runs on a worker thread, ahead of decoding)"""
+    with tokenizer_lock:
+        if translation_backend == "ct2":
+            return [
+                translation_tokenizer.convert_ids_to_tokens(ids)
+                for ids in translation_tokenizer(texts, src_lang=source_lang).input_ids
+            ]
+        
+        return translation_tokenizer(
+            texts,
+            return_tensors="pt",
+            padding=True,
+            src_lang=source_lang
+        )
+
+
+def translate_tokenized(inputs, target_lang: str, target_token_id: int, beams: int = 1):
+    """Decode a tokenized batch sharing one target language and beam width"""
+    if translation_backend == "ct2":
+        results = translation_model.translate_batch(
+            inputs,
+            target_prefix=[[target_lang]] * len(inputs),
+            beam_size=beams,
+            max_decoding_length=max_output_tokens(max(len(tokens) for tokens in inputs))
+        )
+        # First token of each hypothesis is the target language prefix
+        with tokenizer_lock:
+            return [
+                translation_tokenizer.decode(
+                    translation_tokenizer.convert_tokens_to_ids(result.hypotheses[0][1:]),
+                    skip_special_tokens=True
+                )
+                for result in results
+            ]
+    
+    # Move to device
+    device = next(translation_model.parameters()).device
+    inputs = {k: v.to(device) for k, v in inputs.items()}
+    
+    # Generate translation (inference mode: no autograd bookkeeping or version counters)
+    with torch.inference_mode(), model_stream("translate"):
+        translated_tokens = translation_model.generate(
+            **inputs,
+            forced_bos_token_id=target_token_id,
+            max_new_tokens=max_output_tokens(inputs["input_ids"].shape[1]),
+            min_new_tokens=1,
+            num_beams=beams,
+            do_sample=False,
+            use_cache=True,
+            **({"early_stopping": True, "length_penalty": 1.0} if beams > 1 else {})
+        )
+    
+    # Decode translation
+    with tokenizer_lock:
+        return translation_tokenizer.batch_decode(
+            translated_tokens,
+            skip_special_tokens=True
+        )
+
+
+def generate_translations(texts, source_lang: str, target_lang: str, target_token_id: int, beams: int = 1):
+    """Translate a batch of texts sharing one language pair and beam width with the loaded backend"""
+    return translate_tokenized(tokenize_translations(texts, source_lang), target_lang, target_token_id, beams)
+
+
+async def translation_batch_worker():
+    """
+    Background task that drains the request queue into micro-batches
+    
+    Collects up to TRANSLATE_MAX_BATCH queued requests, or whatever arrived within
+    TRANSLATE_MAX_WAIT_MS, groups them by language pair and resolves each request's
+    future from length-sorted sub-batches (requests with different beam widths
+    are decoded separately). Each sub-batch is tokenized on a worker thread while
+    the previous one is decoding.
+    """
+    loop = asyncio.get_running_loop()
+    # At most one sub-batch decoding and one tokenized sub-batch waiting behind it
+    in_flight = asyncio.Semaphore(2)
+    pending = set()
+    while True:
+        batch = [await translation_queue.get()]
+        deadline = loop.time() + TRANSLATE_MAX_WAIT_MS / 1000
+        
+        while len(batch) < TRANSLATE_MAX_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(translation_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        
+        # Group by language pair and beam width, dropping requests whose client already went away
+        groups = {}
+        for item in batch:
+            if not item[-1].done():
+                groups.setdefault(item[1:5], []).append(item)
+        
+        for (source_lang, target_lang, target_token_id, beams), items in groups.items():
+            items.sort(key=lambda item: len(item[0]))
+            for i in range(0, len(items), TRANSLATE_SUB_BATCH):
+                sub_batch = items[i:i + TRANSLATE_SUB_BATCH]
+                try:
+                    inputs = await asyncio.to_thread(
+                        tokenize_translations, [item[0] for item in sub_batch], source_lang
+                    )
+                except Exception as e:
+                    fail_translation_batch(sub_batch, e)
+                    continue
+                
+                # Don't wait for decoding; the executor runs sub-batches in order
+                await in_flight.acquire()
+                task = asyncio.create_task(resolve_translation_batch(
+                    sub_batch, inputs, target_lang, target_token_id, beams
+                ))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                task.add_done_callback(lambda _: in_flight.release())
+
+
+async def resolve_translation_batch(items, inputs, target_lang, target_token_id, beams):
+    """Decode one tokenized sub-batch and resolve each request's future"""
+    loop = asyncio.get_running_loop()
+    try:
+        results = await loop.run_in_executor(
+            translate_executor, translate_tokenized, inputs, target_lang, target_token_id, beams
+        )
+    except Exception as e:
+        fail_translation_batch(items, e)
+        return
+    
+    logger.debug(f"Translation batch size: {len(items)} (-> {target_lang}, beams={beams})")
+    for item, result in zip(items, results):
+        if not item[-1].done():
+            item[-1].set_result(result)
+
+
+def fail_translation_batch(items, error):
+    """Propagate a sub-batch failure to every waiting request"""
+    logger.error(f"Error in translation batch of {len(items)}: {error}")
+    for item in items:
+        if not item[-1].done():
+            item[-1].set_exception(error)
+
+
+def start_translation_batcher():
+    """Create the request queue and start the batching task (call from a running event loop)"""
+    global translation_queue
+    translation_queue = asyncio.Queue()
+    return asyncio.create_task(translation_batch_worker())
+
+
 @translate_router.get("/languages")
 async def list_supported_languages():
     """
@@ -226,11 +543,9 @@ async def list_supported_languages():
     Useful for debugging and finding correct language codes
     """
     # Lazy load model if needed
-    if translation_tokenizer is None:
-        model_dir = os.getenv("MODEL_CACHE_DIR", "./models")
-        device = "cuda" if torch.cuda.is_available() else "cpu"
+    if translation_model is None or translation_tokenizer is None:
         try:
-            load_translation_model(model_dir, device)
+            await asyncio.to_thread(lazy_load_translation_model)
         except Exception as e:
             raise HTTPException(
                 status_code=503,
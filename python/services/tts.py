@@ -4,30 +4,142 @@ Generates voice-cloned speech from text
 """
 
 import os
+import re
+import copy
+import math
+import hashlib
+import shutil
+import struct
+import asyncio
 import logging
+import tempfile
+import textwrap
+import functools
+import itertools
+import threading
+from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import torch
+import torch.nn.functional as F
+import torchaudio
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from TTS.api import TTS
+from TTS.utils.generic_utils import get_user_data_dir
+from transformers.pytorch_utils import Conv1D
 import soundfile as sf
+from services.cuda_streams import model_stream, model_streams
+from services.result_cache import ResultCache
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
 
 logger = logging.getLogger(__name__)
 
 tts_router = APIRouter()
 tts_model = None
 
+XTTS_SAMPLE_RATE = 24000
+# Rate XTTS conditions on reference audio at, and input rates whose preprocessing is scripted at load
+XTTS_REFERENCE_SAMPLE_RATE = 22050
+# Rate of the XTTS speaker encoder input
+SPEAKER_ENCODER_SAMPLE_RATE = 16000
+COMMON_REFERENCE_RATES = (16000, 22050, 24000, 44100, 48000)
+# Text chunk limits in characters per language (as later XTTS releases use for splitting)
+XTTS_CHAR_LIMITS = {
+    "en": 250, "de": 253, "fr": 273, "es": 239, "it": 213, "pt": 203, "pl": 224, "zh": 82,
+    "ar": 166, "cs": 186, "ru": 182, "nl": 251, "tr": 226, "ja": 71, "hu": 224, "ko": 95
+}
+SENTENCE_END_RE = re.compile(r"(?<=[.!?…。！？])\s+")
+# XTTS GPT audio code for silence; a run of more than 8 ends the useful output
+XTTS_SILENCE_TOKEN = 83
+# Speaker latents per reference audio (path, mtime), so the speaker encoder runs once per voice
+TTS_SPEAKER_CACHE_SIZE = int(os.getenv("TTS_SPEAKER_CACHE_SIZE", "64"))
+# Generated files of repeated (text, reference audio, language) requests -> (path, duration)
+TTS_CACHE_SIZE = int(os.getenv("TTS_CACHE_SIZE", "256"))
+# Longest accepted request text; longer inputs are rejected with 422 before reaching the GPU
+TTS_MAX_TEXT_CHARS = int(os.getenv("TTS_MAX_TEXT_CHARS", "5000"))
+# DeepSpeed fused inference kernels for the XTTS GPT stage (CUDA only, needs `deepspeed`)
+TTS_DEEPSPEED = os.getenv("TTS_DEEPSPEED", "0") == "1"
+# "int8": int8 weight-only GPT block projections on CUDA (per-channel scales, dequantized
+# to the activation dtype per matmul); "none" keeps full-precision weights
+TTS_QUANT = os.getenv("TTS_QUANT", "none")
+# Half-precision autocast around XTTS inference on CUDA (bf16 where supported, else fp16)
+TTS_AUTOCAST = os.getenv("TTS_AUTOCAST", "1") == "1"
+# Regional torch.compile of the GPT blocks and HiFi-GAN decoder on CUDA
+TTS_COMPILE = os.getenv("TTS_COMPILE", "1") == "1"
+# Warm-up synthesis at load on CUDA (kernel selection, cuDNN autotuning, allocator growth);
+# a compiled model always warms up, since that is where compilation and its fallback happen
+TTS_WARMUP = os.getenv("TTS_WARMUP", "1") == "1"
+# Fused scaled_dot_product_attention (flash / memory-efficient kernels) in the XTTS GPT on CUDA
+TTS_SDPA = os.getenv("TTS_SDPA", "1") == "1"
+# Run the HiFi-GAN vocoder as an ONNX graph on ONNX Runtime (TensorRT EP when available,
+# else CUDA EP); needs `onnxruntime-gpu`. The exported graph and TensorRT engines are
+# kept in the model directory
+TTS_VOCODER_ORT = os.getenv("TTS_VOCODER_ORT", "0") == "1"
+VOCODER_ONNX_FILE = "xtts-hifigan.onnx"
+
+# Concurrent syntheses sharing the one XTTS model on the GPU, each on its own worker
+# thread and pair of CUDA streams (overlaps launches of short requests)
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "1"))
+# (GPT stream, vocoder stream) names per synthesis slot
+TTS_STREAMS = [("tts", "tts_vocoder")] + [
+    (f"tts{i}", f"tts_vocoder{i}") for i in range(1, TTS_CONCURRENCY)
+]
+
+# Synthesis runs off the event loop on the TTS workers, at most TTS_CONCURRENCY at a time
+tts_executor = ThreadPoolExecutor(max_workers=TTS_CONCURRENCY, thread_name_prefix="tts")
+tts_slots = asyncio.Semaphore(TTS_CONCURRENCY)
+# Output file writes, handed off by the TTS workers so disk I/O overlaps the next decode
+tts_io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tts-io")
+# XTTS keeps the GPT prompt prefix on the model between calls, so each worker thread
+# decodes through its own shallow copy of the inference wrapper (see worker_slot)
+tts_worker = threading.local()
+tts_slot_ids = itertools.count()
+# Streamed synthesis goes through XTTS's own inference_stream (shared wrapper), one at a
+# time; held for a whole request, including every chunk
+tts_lock = asyncio.Lock()
+# Cached outputs are private copies in a per-process directory (created with the model,
+# removed on shutdown): client output paths can be overwritten (e.g. by /tts/batch), so
+# they are never served from directly
+tts_output_cache_dir = None
+tts_output_cache = ResultCache(
+    TTS_CACHE_SIZE,
+    on_evict=lambda entry: tts_io_executor.submit(remove_file, entry[0])
+)
+# Keys synthesized once; a line is only copied into the cache when it comes back, so
+# one-off lines don't pay for an extra WAV write
+tts_output_seen = ResultCache(TTS_CACHE_SIZE)
+
 
 class TTSRequest(BaseModel):
-    text: str
+    text: str = Field(..., max_length=TTS_MAX_TEXT_CHARS)
     reference_audio: str  # Path to reference audio file
     language: str = "uz"  # Language code (uz for Uzbek)
     output_path: str  # Path to save generated audio
     emotion: str = "neutral"  # Currently unused by XTTS
+    # Output rate; XTTS generates 24 kHz, other rates are resampled on the GPU before writing
+    sample_rate: int = Field(XTTS_SAMPLE_RATE, ge=8000, le=48000)
+
+
+class TTSStreamRequest(BaseModel):
+    text: str = Field(..., max_length=TTS_MAX_TEXT_CHARS)
+    reference_audio: str  # Path to reference audio file
+    language: str = "uz"  # Language code (uz for Uzbek)
+    emotion: str = "neutral"  # Currently unused by XTTS
+
+
+class TTSBatchRequest(BaseModel):
+    items: List[TTSRequest]
 
 
 def load_tts_model(model_dir: str, device: str):
     """Load Coqui XTTS model with terms acceptance"""
-    global tts_model
+    global tts_model, tts_output_cache_dir
     
     try:
         model_name = "tts_models/multilingual/multi-dataset/xtts_v2"
@@ -44,7 +156,38 @@ def load_tts_model(model_dir: str, device: str):
             logger.warning("You may need to accept terms manually at: https://huggingface.co/coqui/XTTS-v2")
         
         use_gpu = (device == "cuda")
+        if use_gpu:
+            torch.set_float32_matmul_precision("high")
         tts_model = TTS(model_name, gpu=use_gpu)
+        # Inference only: no dropout and no autograd tracking on the weights, whichever
+        # thread runs the model (grad mode itself is thread-local; inference paths also
+        # run under torch.inference_mode). Xtts.eval() rebuilds the GPT inference wrapper
+        # and returns None, so the calls can't be chained
+        xtts = tts_model.synthesizer.tts_model
+        xtts.eval()
+        xtts.requires_grad_(False)
+        cached_speaker_latents.cache_clear()
+        tts_output_cache.clear()
+        tts_output_seen.clear()
+        if TTS_CACHE_SIZE > 0 and tts_output_cache_dir is None:
+            tts_output_cache_dir = tempfile.mkdtemp(prefix="tts-output-cache-")
+        for sample_rate in COMMON_REFERENCE_RATES:
+            reference_preprocessor(sample_rate)
+        
+        deepspeed_enabled = use_gpu and TTS_DEEPSPEED and enable_deepspeed(model_name)
+        if use_gpu and TTS_SDPA and not deepspeed_enabled:
+            enable_sdpa_attention()
+        if use_gpu and TTS_QUANT == "int8" and not deepspeed_enabled:
+            quantize_tts_gpt()
+        
+        vocoder_ort_enabled = use_gpu and TTS_VOCODER_ORT and enable_vocoder_ort(model_dir)
+        
+        # Warm up on GPU so the first request doesn't pay for allocator growth (or compilation);
+        # DeepSpeed already replaces the GPT blocks with fused kernels, so skip compiling them
+        if use_gpu and TTS_COMPILE and not deepspeed_enabled:
+            compile_tts_model(compile_decoder=not vocoder_ort_enabled)
+        elif use_gpu and TTS_WARMUP:
+            warmup_tts()
         
         logger.info("TTS model loaded successfully")
         return tts_model
@@ -61,18 +204,683 @@ def load_tts_model(model_dir: str, device: str):
         raise
 
 
-@tts_router.post("")
-async def generate_speech(request: TTSRequest):
+def enable_deepspeed(model_name: str) -> bool:
+    """Reload the XTTS checkpoint with DeepSpeed inference kernels; False if unavailable"""
+    try:
+        import deepspeed  # noqa: F401
+    except ImportError:
+        logger.warning("deepspeed not installed, using the default XTTS GPT backend")
+        return False
+    
+    xtts = tts_model.synthesizer.tts_model
+    checkpoint_dir = os.path.join(get_user_data_dir("tts"), model_name.replace("/", "--"))
+    try:
+        xtts.load_checkpoint(xtts.config, checkpoint_dir=checkpoint_dir, eval=True, use_deepspeed=True)
+        xtts.cuda()
+    except Exception as e:
+        logger.warning(f"DeepSpeed initialization failed, using the default XTTS GPT backend: {e}")
+        xtts.load_checkpoint(xtts.config, checkpoint_dir=checkpoint_dir, eval=True, use_deepspeed=False)
+        xtts.cuda()
+        return False
+    logger.info("XTTS GPT running on DeepSpeed inference kernels")
+    return True
+
+
+def sdpa_attn(attention):
     """
-    Generate speech from text using voice cloning
+    Drop-in GPT2Attention._attn on top of F.scaled_dot_product_attention
     
-    Args:
-        request: TTSRequest with text, reference_audio, language, output_path, emotion
+    Covers the shapes XTTS produces: full causal passes without a padding mask and
+    single-token decode steps (with or without one). Anything else, and calls that
+    need the attention weights' extras (head mask, per-layer scaling), use the
+    original implementation. Attention weights are not returned.
+    """
+    eager_attn = attention._attn
+    
+    def _attn(query, key, value, attention_mask=None, head_mask=None):
+        q_len, k_len = query.size(-2), key.size(-2)
+        if (head_mask is not None or attention.scale_attn_by_inverse_layer_idx
+                or (q_len > 1 and (attention_mask is not None or q_len != k_len))):
+            return eager_attn(query, key, value, attention_mask, head_mask)
+        if attention_mask is not None:
+            attention_mask = attention_mask.to(query.dtype)
+        scale = 1 / math.sqrt(value.size(-1)) if attention.scale_attn_weights else 1.0
+        attn_output = F.scaled_dot_product_attention(
+            query, key, value, attn_mask=attention_mask, is_causal=q_len > 1, scale=scale
+        )
+        return attn_output, None
+    
+    return _attn
+
+
+def enable_sdpa_attention():
+    """Route every XTTS GPT block's attention through the fused SDPA kernels"""
+    torch.backends.cuda.enable_flash_sdp(True)
+    torch.backends.cuda.enable_mem_efficient_sdp(True)
+    for block in tts_model.synthesizer.tts_model.gpt.gpt.h:
+        block.attn._attn = sdpa_attn(block.attn)
+    logger.info("XTTS GPT attention using scaled_dot_product_attention")
+
+
+class WeightOnlyInt8Linear(torch.nn.Module):
+    """
+    Linear layer with int8 weights and one fp scale per output channel
+    
+    Weights are dequantized to the activation dtype inside each matmul, so decoding
+    reads a quarter of the fp32 weight bytes. Everything is stored as buffers: the
+    layer has no trainable parameters.
+    """
+    
+    def __init__(self, weight: torch.Tensor, bias: torch.Tensor = None):
+        super().__init__()
+        weight = weight.float()
+        scales = weight.abs().amax(dim=1).clamp(min=1e-8) / 127
+        self.register_buffer(
+            "weight", torch.round(weight / scales[:, None]).clamp(-127, 127).to(torch.int8)
+        )
+        self.register_buffer("scales", scales)
+        self.register_buffer("bias", bias)
+    
+    @classmethod
+    def from_conv1d(cls, conv: Conv1D) -> "WeightOnlyInt8Linear":
+        # HF Conv1D stores its weight as (in_features, out_features)
+        return cls(conv.weight.detach().t(), conv.bias.detach())
+    
+    def forward(self, x):
+        out = F.linear(x, self.weight.to(x.dtype)) * self.scales.to(x.dtype)
+        if self.bias is not None:
+            out = out + self.bias.to(x.dtype)
+        return out
+
+
+def quantize_tts_gpt():
+    """
+    Quantize the XTTS GPT blocks' projections (attention and MLP) to int8 weight-only
+    
+    Decoding is weight-bandwidth bound, so smaller weights cut the traffic per token.
+    Embeddings, heads and the HiFi-GAN decoder keep their precision.
+    """
+    blocks = tts_model.synthesizer.tts_model.gpt.gpt.h
+    for block in blocks:
+        for parent in (block.attn, block.mlp):
+            for name, child in list(parent.named_children()):
+                if isinstance(child, Conv1D):
+                    setattr(parent, name, WeightOnlyInt8Linear.from_conv1d(child))
+    torch.cuda.empty_cache()
+    logger.info("XTTS GPT blocks quantized to int8 weight-only")
+
+
+def enable_vocoder_ort(model_dir: str) -> bool:
+    """
+    Route the HiFi-GAN decoder through ONNX Runtime; False if unavailable
+    
+    The decoder is exported once (dynamic latent length) to the model directory.
+    TensorRT engines are built by the TensorRT execution provider on first use and
+    cached next to the graph, so only the first start pays for engine building.
+    """
+    if ort is None:
+        logger.warning("onnxruntime not installed, running the HiFi-GAN vocoder in PyTorch")
+        return False
+    
+    providers = [
+        provider for provider in ("TensorrtExecutionProvider", "CUDAExecutionProvider")
+        if provider in ort.get_available_providers()
+    ]
+    if not providers:
+        logger.warning("onnxruntime has no GPU execution provider, running the HiFi-GAN vocoder in PyTorch")
+        return False
+    
+    decoder = tts_model.synthesizer.tts_model.hifigan_decoder
+    onnx_dir = os.path.join(model_dir, "onnx")
+    onnx_path = os.path.join(onnx_dir, VOCODER_ONNX_FILE)
+    try:
+        if not os.path.exists(onnx_path):
+            logger.info(f"Exporting HiFi-GAN vocoder to {onnx_path}...")
+            os.makedirs(onnx_dir, exist_ok=True)
+            device = next(decoder.parameters()).device
+            # (batch, latent frames, GPT hidden size) and the (batch, 512, 1) speaker embedding
+            latents = torch.randn(1, 64, 1024, device=device)
+            g = torch.randn(1, 512, 1, device=device)
+            with torch.no_grad():
+                torch.onnx.export(
+                    decoder, (latents, g), onnx_path,
+                    input_names=["latents", "g"],
+                    output_names=["wav"],
+                    dynamic_axes={"latents": {1: "frames"}, "wav": {2: "samples"}},
+                    opset_version=17
+                )
+        
+        provider_options = []
+        for provider in providers:
+            if provider == "TensorrtExecutionProvider":
+                provider_options.append({
+                    "trt_fp16_enable": TTS_AUTOCAST,
+                    "trt_engine_cache_enable": True,
+                    "trt_engine_cache_path": onnx_dir
+                })
+            else:
+                provider_options.append({})
+        session = ort.InferenceSession(onnx_path, providers=providers, provider_options=provider_options)
+    except Exception as e:
+        logger.warning(f"ONNX Runtime vocoder setup failed, running the HiFi-GAN vocoder in PyTorch: {e}")
+        return False
+    
+    def forward(latents, g=None):
+        wav, = session.run(None, {
+            "latents": latents.float().cpu().numpy(),
+            "g": g.float().cpu().numpy()
+        })
+        return torch.from_numpy(wav).to(latents.device)
+    
+    decoder.forward = forward
+    logger.info(f"HiFi-GAN vocoder running on ONNX Runtime ({session.get_providers()[0]})")
+    return True
+
+
+def compile_tts_model(compile_decoder: bool = True):
+    """
+    Compile the hot regions of XTTS: each GPT block, the per-step output head
+    (final norm + mel head, fused into one graph) and the HiFi-GAN decoder
+    
+    Compiling the repeated blocks rather than the whole model keeps cold-start
+    compile time low. Shapes change every decoding step, so graphs are compiled
+    with dynamic shapes and without CUDA graphs: the GPT-2 KV cache in transformers
+    4.33 is concatenated per token rather than preallocated, so no decode step
+    repeats an earlier one's shapes and a captured graph could never be replayed.
+    Falls back to eager on failure.
+    The decoder is left alone when `compile_decoder` is False (e.g. it runs on ONNX Runtime).
+    """
+    xtts = tts_model.synthesizer.tts_model
+    blocks = xtts.gpt.gpt.h
+    eager_blocks = list(blocks)
+    gpt_inference = xtts.gpt.gpt_inference
+    eager_lm_head = gpt_inference.lm_head
+    eager_decoder_forward = xtts.hifigan_decoder.forward
+    try:
+        for i, block in enumerate(eager_blocks):
+            blocks[i] = torch.compile(block, dynamic=True)
+        gpt_inference.lm_head = torch.compile(eager_lm_head, dynamic=True, fullgraph=True)
+        if compile_decoder:
+            xtts.hifigan_decoder.forward = torch.compile(eager_decoder_forward, dynamic=True)
+        warmup_tts()
+        logger.info("TTS model compiled")
+    except Exception as e:
+        logger.warning(f"torch.compile failed for TTS model, using eager mode: {e}")
+        for i, block in enumerate(eager_blocks):
+            blocks[i] = block
+        gpt_inference.lm_head = eager_lm_head
+        xtts.hifigan_decoder.forward = eager_decoder_forward
+
+
+def warmup_tts():
+    """Run one representative-length synthesis against a synthetic reference voice (3 s tone)"""
+    sample_rate = 22050
+    t = np.arange(3 * sample_rate) / sample_rate
+    tone = (0.1 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    with tempfile.NamedTemporaryFile(suffix=".wav") as reference:
+        sf.write(reference.name, tone, sample_rate)
+        with torch.inference_mode():
+            synthesize(
+                "This is a warmup sentence, about as long as a typical line of dubbed dialogue.",
+                reference.name,
+                "en"
+            )
+
+
+class ReferencePreprocess(torch.nn.Module):
+    """
+    Reference audio -> mono (optionally peak-normalized), resampled for the GPT
+    conditioning (22.05 kHz) and the speaker encoder (16 kHz)
+    
+    The same steps XTTS 0.20 runs inside get_conditioning_latents and the two
+    latent methods, with both resampling kernels built once.
+    """
+    
+    def __init__(self, orig_freq: int):
+        super().__init__()
+        self.resample_gpt = torchaudio.transforms.Resample(orig_freq, XTTS_REFERENCE_SAMPLE_RATE)
+        self.resample_speaker = torchaudio.transforms.Resample(orig_freq, SPEAKER_ENCODER_SAMPLE_RATE)
+    
+    def forward(self, wav: torch.Tensor, sound_norm: bool) -> Tuple[torch.Tensor, torch.Tensor]:
+        if wav.size(0) > 1:
+            wav = wav.mean(dim=0, keepdim=True)
+        if sound_norm:
+            wav = (wav / torch.abs(wav).max()) * 0.75
+        return self.resample_gpt(wav), self.resample_speaker(wav)
+
+
+@functools.lru_cache(maxsize=None)
+def reference_preprocessor(orig_freq: int):
+    """TorchScript ReferencePreprocess for one input sample rate (resampling kernel built once)"""
+    return torch.jit.script(ReferencePreprocess(orig_freq).eval())
+
+
+@functools.lru_cache(maxsize=TTS_SPEAKER_CACHE_SIZE)
+def cached_speaker_latents(reference_audio: str, mtime_ns: int, size: int):
+    """
+    Compute XTTS conditioning latents for a reference audio (mtime/size invalidate edited files)
+    
+    Follows Xtts.get_conditioning_latents of the pinned TTS 0.20 for a single file
+    (the first max_ref_len seconds at the file's own rate, downmixed to mono), with
+    the CPU preprocessing done by the scripted reference_preprocessor. That method
+    returns (gpt_cond_latent, diffusion_cond, speaker_embedding); only the HiFi-GAN
+    pair is kept here.
+    """
+    xtts = tts_model.synthesizer.tts_model
+    config = xtts.config
+    wav, sample_rate = torchaudio.load(reference_audio)
+    wav = wav[:, :sample_rate * config.max_ref_len]
+    with torch.inference_mode():
+        gpt_audio, speaker_audio = reference_preprocessor(sample_rate)(wav, bool(config.sound_norm_refs))
+        # Already at each method's target rate, so XTTS skips its own resampling
+        speaker_embedding = xtts.get_speaker_embedding(
+            speaker_audio.to(xtts.device), SPEAKER_ENCODER_SAMPLE_RATE
+        )
+        gpt_cond_latent = xtts.get_gpt_cond_latents(
+            gpt_audio.to(xtts.device), XTTS_REFERENCE_SAMPLE_RATE, length=config.gpt_cond_len
+        )
+    return gpt_cond_latent, speaker_embedding
+
+
+def tts_autocast():
+    """Autocast context for XTTS inference: half precision on CUDA, no-op otherwise"""
+    enabled = TTS_AUTOCAST and torch.cuda.is_available()
+    dtype = torch.bfloat16 if enabled and torch.cuda.is_bf16_supported() else torch.float16
+    return torch.autocast("cuda", dtype=dtype, enabled=enabled)
+
+
+def reference_key(reference_audio: str):
+    """Cache key identifying a reference audio file version: (path, mtime_ns, size)"""
+    stat = os.stat(reference_audio)
+    return reference_audio, stat.st_mtime_ns, stat.st_size
+
+
+def speaker_latents(reference_audio: str):
+    """(gpt_cond_latent, speaker_embedding) for a reference audio, computed once per file version"""
+    return cached_speaker_latents(*reference_key(reference_audio))
+
+
+def synthesize(text: str, reference_audio: str, language: str, latents=None):
+    """
+    Synthesize speech with the low-level XTTS API
+    
+    Same sampling settings as tts_to_file (taken from the model config), but the
+    speaker latents come from the cache (or `latents`, if already looked up).
     
     Returns:
-        JSON with success status and audio duration
+        Waveform as a float32 array at XTTS_SAMPLE_RATE
+    """
+    gpt_cond_latent, speaker_embedding = latents or speaker_latents(reference_audio)
+    with model_stream(worker_slot().streams[0]), tts_autocast():
+        return np.concatenate(list(
+            vocoded_sentences(text, language, gpt_cond_latent, speaker_embedding)
+        ))
+
+
+def synthesize_to_file(text: str, reference_audio: str, language: str, output_path: str,
+                       latents=None, sample_rate: int = XTTS_SAMPLE_RATE):
     """
-    # Lazy load TTS model on first request (in case it failed at startup)
+    Synthesize speech straight into a 16-bit PCM WAV file at `sample_rate`
+    
+    Each sentence is quantized to int16 (with clipping) and written on the I/O pool
+    as soon as it is vocoded, while the GPT decodes the next one, instead of holding
+    the whole waveform for one write at the end. Writes to the file stay in order.
+    A partially written file is removed if synthesis fails.
+    
+    Returns:
+        Duration in seconds
+    """
+    gpt_cond_latent, speaker_embedding = latents or speaker_latents(reference_audio)
+    frames = 0
+    pending_write = None
+    try:
+        with model_stream(worker_slot().streams[0]), tts_autocast(), sf.SoundFile(
+            output_path, mode="w", samplerate=sample_rate, channels=1, subtype="PCM_16"
+        ) as output:
+            try:
+                for wav in vocoded_sentences(text, language, gpt_cond_latent, speaker_embedding, sample_rate):
+                    pcm = (np.clip(wav, -1.0, 1.0) * 32767).astype(np.int16)
+                    if pending_write is not None:
+                        pending_write.result()
+                    pending_write = tts_io_executor.submit(output.write, pcm)
+                    frames += len(pcm)
+            finally:
+                # The file must not be closed under an in-flight write
+                if pending_write is not None:
+                    pending_write.result()
+    except Exception:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    return frames / sample_rate
+
+
+def split_sentences(text: str, language: str) -> List[str]:
+    """
+    Split text into chunks of whole sentences up to the language's character limit
+    
+    The pinned TTS 0.20 has no text splitting of its own. This follows split_sentence
+    from later releases, with a punctuation regex instead of spaCy: sentences are
+    packed greedily and a sentence longer than the limit is wrapped on whitespace.
+    """
+    limit = XTTS_CHAR_LIMITS.get(language, 250)
+    chunks = []
+    for sentence in SENTENCE_END_RE.split(text.strip()):
+        if not sentence:
+            continue
+        if chunks and len(chunks[-1]) + 1 + len(sentence) <= limit:
+            chunks[-1] += " " + sentence
+        elif len(sentence) > limit:
+            chunks.extend(textwrap.wrap(sentence, width=limit, break_on_hyphens=False))
+        else:
+            chunks.append(sentence)
+    return chunks or [text.strip()]
+
+
+def trim_silence(gpt_codes, gpt_latents):
+    """As Xtts.inference: cut the latents where the GPT emits more than 8 silence codes in a row"""
+    run = 0
+    # One device-to-host copy of the codes instead of a sync per element
+    for k, code in enumerate(gpt_codes[0].tolist()):
+        run = run + 1 if code == XTTS_SILENCE_TOKEN else 0
+        if run > 8:
+            return gpt_latents[:, :k]
+    return gpt_latents
+
+
+def worker_slot():
+    """
+    Synthesis slot of the current worker thread
+    
+    Holds the slot's CUDA stream names and a shallow copy of the XTTS GPT inference
+    wrapper: it shares every weight (and compiled module) with the model but keeps
+    its own cached prompt prefix, so concurrent workers don't overwrite each other's.
+    """
+    xtts = tts_model.synthesizer.tts_model
+    if getattr(tts_worker, "xtts", None) is not xtts:
+        if not hasattr(tts_worker, "streams"):
+            tts_worker.streams = TTS_STREAMS[next(tts_slot_ids) % TTS_CONCURRENCY]
+        tts_worker.gpt_inference = copy.copy(xtts.gpt.gpt_inference)
+        tts_worker.xtts = xtts
+    return tts_worker
+
+
+def generate_codes(gpt_inference, gpt_cond_latent, text_tokens, **generate_kwargs):
+    """XTTS 0.20 GPT.generate, decoding through the given inference wrapper instead of the shared one"""
+    gpt = tts_model.synthesizer.tts_model.gpt
+    text_inputs = F.pad(text_tokens, (0, 1), value=gpt.stop_text_token)
+    text_inputs = F.pad(text_inputs, (1, 0), value=gpt.start_text_token)
+    emb = gpt.text_embedding(text_inputs) + gpt.text_pos_embedding(text_inputs)
+    emb = torch.cat([gpt_cond_latent, emb], dim=1)
+    gpt_inference.store_prefix_emb(emb)
+    
+    gpt_inputs = torch.full(
+        (emb.shape[0], emb.shape[1] + 1), fill_value=1, dtype=torch.long, device=text_inputs.device
+    )
+    gpt_inputs[:, -1] = gpt.start_audio_token
+    codes = gpt_inference.generate(
+        gpt_inputs,
+        bos_token_id=gpt.start_audio_token,
+        pad_token_id=gpt.stop_audio_token,
+        eos_token_id=gpt.stop_audio_token,
+        max_length=gpt.max_mel_tokens,
+        **generate_kwargs
+    )
+    return codes[:, gpt_inputs.shape[1]:]
+
+
+@torch.inference_mode()
+def vocoded_sentences(text: str, language: str, gpt_cond_latent, speaker_embedding,
+                      sample_rate: int = XTTS_SAMPLE_RATE):
+    """
+    XTTS inference over explicitly split sentences, with the vocoder overlapped
+    
+    Mirrors Xtts.inference (including its trailing-silence trim) per sentence chunk
+    from split_sentences, except that each sentence's HiFi-GAN
+    pass is queued on the vocoder stream (gated by an event on its GPT latents) and
+    the GPT moves straight on to decoding the next sentence on the current stream.
+    Yields one float32 waveform per sentence (resampled to `sample_rate` on the
+    vocoder stream), each once the next sentence's vocoder pass is queued. On CPU
+    it runs sequentially.
+    """
+    xtts = tts_model.synthesizer.tts_model
+    config = xtts.config
+    slot = worker_slot()
+    vocoder_stream = model_streams.get(slot.streams[1])
+    sentences = split_sentences(text.strip().lower(), language)
+    
+    pending = None
+    for sentence in sentences:
+        text_tokens = torch.IntTensor(
+            xtts.tokenizer.encode(sentence.strip().lower(), lang=language)
+        ).unsqueeze(0).to(xtts.device)
+        assert text_tokens.shape[-1] < xtts.args.gpt_max_text_tokens, \
+            "XTTS can only generate text with a maximum of 400 tokens."
+        
+        gpt_codes = generate_codes(
+            slot.gpt_inference,
+            gpt_cond_latent,
+            text_tokens,
+            input_tokens=None,
+            do_sample=True,
+            top_p=config.top_p,
+            top_k=config.top_k,
+            temperature=config.temperature,
+            num_return_sequences=xtts.gpt_batch_size,
+            num_beams=1,
+            length_penalty=config.length_penalty,
+            repetition_penalty=config.repetition_penalty,
+            output_attentions=False
+        )
+        expected_output_len = torch.tensor([gpt_codes.shape[-1] * xtts.gpt.code_stride_len], device=xtts.device)
+        text_len = torch.tensor([text_tokens.shape[-1]], device=xtts.device)
+        gpt_latents = xtts.gpt(
+            text_tokens,
+            text_len,
+            gpt_codes,
+            expected_output_len,
+            cond_latents=gpt_cond_latent,
+            return_attentions=False,
+            return_latent=True
+        )
+        gpt_latents = trim_silence(gpt_codes, gpt_latents)
+        
+        vocoded = None
+        if vocoder_stream is not None:
+            latents_ready = torch.cuda.Event()
+            latents_ready.record()
+            vocoder_stream.wait_event(latents_ready)
+            # Latents were allocated on the GPT stream but are consumed on the vocoder stream
+            gpt_latents.record_stream(vocoder_stream)
+            vocoded = torch.cuda.Event()
+        with torch.cuda.stream(vocoder_stream):
+            wav = xtts.hifigan_decoder(gpt_latents, g=speaker_embedding).squeeze()
+            if sample_rate != XTTS_SAMPLE_RATE:
+                # In fp32: under autocast the resampler's conv1d would drop to half precision
+                with torch.autocast(wav.device.type, enabled=False):
+                    wav = output_resampler(sample_rate, str(wav.device))(wav.float())
+            if vocoded is not None:
+                vocoded.record()
+        
+        if pending is not None:
+            yield finished_wav(*pending)
+        pending = (wav, vocoded)
+    
+    if pending is not None:
+        yield finished_wav(*pending)
+
+
+@functools.lru_cache(maxsize=None)
+def output_resampler(sample_rate: int, device: str):
+    """Resampler from the 24 kHz vocoder output to `sample_rate` (kernel built once per rate)"""
+    return torchaudio.transforms.Resample(XTTS_SAMPLE_RATE, sample_rate).to(device)
+
+
+def finished_wav(wav, vocoded=None):
+    """Wait for a queued vocoder pass (if any) and return its output as a float32 array"""
+    if vocoded is not None:
+        vocoded.synchronize()
+    return wav.float().cpu().numpy()
+
+
+def synthesize_batch(items):
+    """
+    Synthesize and write a list of TTSRequests on the TTS worker
+    
+    Latents are looked up once per distinct reference audio up front. Returns one
+    result per item, in order: status "OK" with the duration, or "ERR" with the error.
+    """
+    latents = {}
+    for reference_audio in {item.reference_audio for item in items}:
+        try:
+            latents[reference_audio] = speaker_latents(reference_audio)
+        except Exception as e:
+            latents[reference_audio] = e
+    
+    results = []
+    for item in items:
+        try:
+            item_latents = latents[item.reference_audio]
+            if isinstance(item_latents, Exception):
+                raise item_latents
+            duration = synthesize_to_file(
+                item.text, item.reference_audio, item.language, item.output_path,
+                latents=item_latents, sample_rate=item.sample_rate
+            )
+            results.append({
+                "status": "OK",
+                "output_path": item.output_path,
+                "duration": round(duration, 2)
+            })
+        except Exception as e:
+            logger.error(f"Error generating speech for {item.output_path}: {e}")
+            results.append({"status": "ERR", "output_path": item.output_path, "error": str(e)})
+    return results
+
+
+def stream_wav_header(sample_rate: int) -> bytes:
+    """WAV header for float32 mono audio of unknown length (sizes set to the maximum)"""
+    byte_rate = sample_rate * 4
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 3, 1, sample_rate, byte_rate, 4, 32)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+
+def next_speech_chunk(chunks):
+    """
+    Advance a speech_chunks generator by one chunk under autocast
+    
+    Runs on the TTS worker, including the device-to-host copy, so the event loop
+    never waits on the GPU. Returns the chunk as float32 PCM bytes (None when exhausted).
+    """
+    with tts_autocast():
+        chunk = next(chunks, None)
+    if chunk is None:
+        return None
+    return chunk.float().cpu().numpy().tobytes()
+
+
+def speech_chunks(text: str, reference_audio: str, language: str):
+    """
+    Generator of XTTS waveform chunks
+    
+    Advanced one chunk at a time on the TTS worker, interleaved with the event
+    loop, so it stays on the default CUDA stream rather than the model stream.
+    """
+    xtts = tts_model.synthesizer.tts_model
+    config = xtts.config
+    gpt_cond_latent, speaker_embedding = speaker_latents(reference_audio)
+    # inference_stream takes one prompt of at most 400 tokens, so long text goes sentence by sentence
+    for sentence in split_sentences(text, language):
+        yield from xtts.inference_stream(
+            sentence,
+            language,
+            gpt_cond_latent,
+            speaker_embedding,
+            stream_chunk_size=20,
+            temperature=config.temperature,
+            length_penalty=config.length_penalty,
+            repetition_penalty=config.repetition_penalty,
+            top_k=config.top_k,
+            top_p=config.top_p
+        )
+
+
+async def stream_speech(text: str, reference_audio: str, language: str):
+    """Yield a WAV header followed by float32 PCM chunks as XTTS produces them"""
+    loop = asyncio.get_running_loop()
+    async with tts_lock:
+        yield stream_wav_header(XTTS_SAMPLE_RATE)
+        chunks = speech_chunks(text, reference_audio, language)
+        while True:
+            chunk = await loop.run_in_executor(tts_executor, next_speech_chunk, chunks)
+            if chunk is None:
+                break
+            yield chunk
+
+
+def remove_file(path: str):
+    """Delete a file if it still exists"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def copy_cached_output(cached_path: str, output_path: str) -> bool:
+    """Copy a cached output to the requested path; False if the cached copy is gone"""
+    try:
+        shutil.copyfile(cached_path, output_path)
+    except FileNotFoundError:
+        if os.path.exists(cached_path):
+            raise
+        return False
+    return True
+
+
+def remove_output_cache():
+    """Drop cached outputs and delete their directory (called on shutdown)"""
+    global tts_output_cache_dir
+    tts_output_seen.clear()
+    tts_output_cache.clear()
+    if tts_output_cache_dir is not None:
+        shutil.rmtree(tts_output_cache_dir, ignore_errors=True)
+        tts_output_cache_dir = None
+
+
+def output_cache_path(cache_key) -> str:
+    """Private file holding the cached output for a (text, reference, language, rate) key"""
+    digest = hashlib.sha1(repr(cache_key).encode()).hexdigest()
+    return os.path.join(tts_output_cache_dir, f"{digest}.wav")
+
+
+async def ensure_output_dir(output_path: str):
+    """Create the parent directory of an output file (off the event loop)"""
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        await asyncio.to_thread(os.makedirs, output_dir, exist_ok=True)
+
+
+async def checked_reference_key(reference_audio: str):
+    """reference_key() stat'ed off the event loop; None if the reference audio is missing"""
+    try:
+        return await asyncio.to_thread(reference_key, reference_audio)
+    except FileNotFoundError:
+        return None
+
+
+def reference_not_found(reference_audio: str) -> ORJSONResponse:
+    """400 response for a missing reference audio (same body as HTTPException, without raising)"""
+    return ORJSONResponse(
+        status_code=400,
+        content={"detail": f"Reference audio file not found: {reference_audio}"}
+    )
+
+
+def ensure_tts_model():
+    """Lazy load TTS model on first request (in case it failed at startup)"""
     if tts_model is None:
         logger.info("TTS model not loaded, attempting to load now...")
         model_dir = os.getenv("MODEL_CACHE_DIR", "./models")
@@ -87,36 +895,104 @@ async def generate_speech(request: TTSRequest):
     
     if tts_model is None:
         raise HTTPException(status_code=503, detail="TTS model not loaded")
+
+
+@tts_router.post("/stream")
+async def stream_generated_speech(request: TTSStreamRequest):
+    """
+    Generate speech and stream it back as it is synthesized
+    
+    Args:
+        request: TTSStreamRequest with text, reference_audio, language, emotion
+    
+    Returns:
+        24 kHz float32 mono WAV, streamed chunk by chunk
+    """
+    ensure_tts_model()
+    if await checked_reference_key(request.reference_audio) is None:
+        return reference_not_found(request.reference_audio)
+    
+    logger.info(f"Streaming speech: {len(request.text)} chars, language: {request.language}")
+    return StreamingResponse(
+        stream_speech(request.text, request.reference_audio, request.language),
+        media_type="audio/wav"
+    )
+
+
+@tts_router.post("/batch", response_class=ORJSONResponse)
+async def generate_speech_batch(request: TTSBatchRequest):
+    """
+    Generate speech for many lines in one call
+    
+    Args:
+        request: TTSBatchRequest with a list of TTSRequest items
+    
+    Returns:
+        JSON with one result per item, in order (status "OK" with duration, or "ERR" with error)
+    """
+    ensure_tts_model()
+    
+    for output_path in {item.output_path for item in request.items}:
+        await ensure_output_dir(output_path)
+    
+    logger.info(f"Generating speech batch: {len(request.items)} items")
+    async with tts_slots:
+        results = await asyncio.get_running_loop().run_in_executor(
+            tts_executor, synthesize_batch, request.items
+        )
+    
+    return {"results": results}
+
+
+@tts_router.post("", response_class=ORJSONResponse)
+async def generate_speech(request: TTSRequest):
+    """
+    Generate speech from text using voice cloning
+    
+    Args:
+        request: TTSRequest with text, reference_audio, language, output_path, emotion
+    
+    Returns:
+        JSON with success status and audio duration
+    """
+    ensure_tts_model()
     
     try:
-        # Validate reference audio exists
-        if not os.path.exists(request.reference_audio):
-            raise HTTPException(
-                status_code=400,
-                detail=f"Reference audio file not found: {request.reference_audio}"
-            )
-        
-        # Create output directory if needed
-        output_dir = os.path.dirname(request.output_path)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
+        # Validate reference audio exists (the same stat identifies its version for the cache)
+        ref_key = await checked_reference_key(request.reference_audio)
+        if ref_key is None:
+            return reference_not_found(request.reference_audio)
+        await ensure_output_dir(request.output_path)
         
         logger.info(f"Generating speech: {len(request.text)} chars, language: {request.language}")
         
-        # Generate speech
-        tts_model.tts_to_file(
-            text=request.text,
-            speaker_wav=request.reference_audio,
-            language=request.language,
-            file_path=request.output_path
-        )
+        # Reuse a previous synthesis of the same line and voice from its private copy
+        cache_key = (request.text, ref_key, request.language, request.sample_rate)
+        cached = tts_output_cache.get(cache_key)
+        if cached is not None:
+            cached_path, duration = cached
+            if await asyncio.to_thread(copy_cached_output, cached_path, request.output_path):
+                logger.info("Reusing cached speech")
+            else:
+                tts_output_cache.pop(cache_key)
+                cached = None
         
-        # Get audio duration
-        if os.path.exists(request.output_path):
-            audio, sr = sf.read(request.output_path)
-            duration = len(audio) / sr
-        else:
-            raise HTTPException(status_code=500, detail="Failed to generate audio file")
+        if cached is None:
+            # Generate speech, written sentence by sentence as 16-bit PCM; the duration
+            # comes from the frames written (no read-back) and a failed write raises
+            async with tts_slots:
+                duration = await asyncio.get_running_loop().run_in_executor(
+                    tts_executor, synthesize_to_file,
+                    request.text, request.reference_audio, request.language, request.output_path,
+                    None, request.sample_rate
+                )
+            if tts_output_cache_dir is not None and tts_output_seen.get(cache_key) is None:
+                tts_output_seen.put(cache_key, True)
+            elif tts_output_cache_dir is not None:
+                cached_path = output_cache_path(cache_key)
+                await asyncio.to_thread(shutil.copyfile, request.output_path, cached_path)
+                tts_output_seen.pop(cache_key)
+                tts_output_cache.put(cache_key, (cached_path, duration))
         
         logger.info(f"Speech generated: {request.output_path} ({duration:.2f}s)")
         